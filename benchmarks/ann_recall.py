@@ -0,0 +1,71 @@
+"""Recall@k and latency of `IVFIndex` against brute force.
+
+Uses the word vectors of a saved model, or synthetic clustered vectors if no
+model is given.
+
+Usage:
+    python -m benchmarks.ann_recall --model data/model/zhwiki_vs100w5mc5.model
+    python -m benchmarks.ann_recall --vocab 200000 --dim 100
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from utils.ann import IVFIndex
+from utils.similarity import top_k, unit_vectors
+
+
+def synthetic_vectors(n, dim, clusters=1000, seed=0):
+    rng = np.random.RandomState(seed)
+    centers = rng.randn(clusters, dim)
+    labels = rng.randint(clusters, size=n)
+    vectors = centers[labels] + 0.5 * rng.randn(n, dim)
+    return vectors.astype(np.float32), [f'w{i}' for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', type=str, default='')
+    parser.add_argument('--vocab', type=int, default=200000)
+    parser.add_argument('--dim', type=int, default=100)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--topn', type=int, default=10)
+    parser.add_argument('--n_probes', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    opts = parser.parse_args()
+
+    if opts.model:
+        from gensim.models import Word2Vec
+        model = Word2Vec.load(opts.model)
+        vectors, words = model.wv.vectors, model.wv.index2word
+    else:
+        vectors, words = synthetic_vectors(opts.vocab, opts.dim)
+
+    start = time.perf_counter()
+    index = IVFIndex.build(vectors, words)
+    print(f'built {len(index.centroids)} lists in {time.perf_counter() - start:.1f}s')
+
+    rng = np.random.RandomState(1)
+    query_ids = rng.choice(len(words), opts.queries, replace=False)
+    unit = unit_vectors(vectors)
+    exclude = [[i] for i in query_ids]
+
+    start = time.perf_counter()
+    expected, _ = top_k(unit[query_ids] @ unit.T, opts.topn, exclude)
+    brute = time.perf_counter() - start
+    print(f'brute force: {opts.queries / brute:>8.0f} queries/s')
+
+    for n_probe in opts.n_probes:
+        start = time.perf_counter()
+        rows, _ = index.search(unit[query_ids], opts.topn, n_probe, exclude)
+        elapsed = time.perf_counter() - start
+        recall = np.mean([
+            len(set(r) & set(e)) / opts.topn for r, e in zip(rows, expected)
+        ])
+        print(f'n_probe={n_probe:>3}: recall@{opts.topn} {recall:.3f}, '
+              f'{opts.queries / elapsed:>8.0f} queries/s')
+
+
+if __name__ == '__main__':
+    main()
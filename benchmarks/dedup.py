@@ -0,0 +1,75 @@
+"""Corpus shrinkage and training speedup of near-duplicate removal.
+
+The corpus is synthetic: a fraction `--dup_rate` of the articles are
+syndicated copies of earlier ones, with a few tokens edited.
+
+Usage:
+    python -m benchmarks.dedup --articles 20000 --dup_rate 0.3 --train
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.processor_chunks import synthetic_articles
+from utils.processor import Deduplicate, Processor, RemoveNonChineseWords
+
+
+def syndicated(articles, dup_rate, edit_rate=0.01, seed=0):
+    rng = random.Random(seed)
+    result = []
+    for article in articles:
+        result.append(article)
+        if rng.random() < dup_rate / (1 - dup_rate):
+            copy = list(article)
+            for _ in range(max(int(len(copy) * edit_rate), 1)):
+                copy[rng.randrange(len(copy))] = rng.choice(article)
+            # copies show up a bit later in the stream
+            result.insert(max(len(result) - rng.randint(0, 50), 0), copy)
+    return result
+
+
+def train_seconds(path, workers):
+    from gensim.models import Word2Vec
+    from gensim.models.word2vec import LineSentence
+    start = time.perf_counter()
+    Word2Vec(LineSentence(path), size=100, window=5, min_count=5,
+             workers=workers, iter=5)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--articles', type=int, default=20000)
+    parser.add_argument('--dup_rate', type=float, default=0.3)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--train', action='store_true',
+                        help='Also train Word2Vec on both outputs.')
+    opts = parser.parse_args()
+
+    articles = syndicated(synthetic_articles(opts.articles), opts.dup_rate)
+    runs = [
+        ('all', Processor([RemoveNonChineseWords()])),
+        ('dedup', Processor([RemoveNonChineseWords(), Deduplicate()])),
+    ]
+    with tempfile.TemporaryDirectory() as folder:
+        sizes = {}
+        for name, processor in runs:
+            path = os.path.join(folder, f'{name}.txt')
+            start = time.perf_counter()
+            processor.process_all(iter(articles), path, workers=opts.workers)
+            elapsed = time.perf_counter() - start
+            with open(path, 'r') as f:
+                lines = sum(1 for _ in f)
+            sizes[name] = os.path.getsize(path)
+            print(f'{name:>6}: {lines} articles, {sizes[name] / 2 ** 20:.1f} MB, '
+                  f'processed in {elapsed:.1f}s')
+            if opts.train:
+                print(f'{name:>6}: trained in {train_seconds(path, opts.workers):.1f}s')
+        print(f'corpus shrinks by {1 - sizes["dedup"] / sizes["all"]:.1%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Latency and throughput of serve.py under concurrent load on localhost.
+
+Each connection sends queries back to back over keep-alive, for similar
+words of random frequent words, or analogies with `--analogies`.
+
+Usage:
+    python serve.py --model data/model/zhwiki_vs100w5mc5.model &
+    python -m benchmarks.load_test --connections 32 --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import numpy as np
+
+
+async def request(reader, writer, method, path, obj=None):
+    body = b'' if obj is None else json.dumps(obj, ensure_ascii=False).encode('utf-8')
+    writer.write(
+        f'{method} {path} HTTP/1.1\r\nHost: localhost\r\n'
+        f'Content-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def client(host, port, words, opts, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        if opts.analogies:
+            query = {'analogy': rng.sample(words, 3)}
+        else:
+            query = {'word': rng.choice(words)}
+        query['topn'] = opts.topn
+        start = time.perf_counter()
+        status, _ = await request(reader, writer, 'POST', '/query', query)
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            errors.append(status)
+    writer.close()
+
+
+async def main(opts):
+    reader, writer = await asyncio.open_connection(opts.host, opts.port)
+    _, obj = await request(reader, writer, 'GET', f'/words?limit={opts.words}')
+    writer.close()
+    words = obj['words']
+
+    latencies, errors = [], []
+    start = time.perf_counter()
+    deadline = start + opts.duration
+    await asyncio.gather(*(
+        client(opts.host, opts.port, words, opts, deadline, latencies, errors)
+        for _ in range(opts.connections)
+    ))
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(opts.host, opts.port)
+    _, stats = await request(reader, writer, 'GET', '/stats')
+    writer.close()
+
+    ms = np.array(latencies) * 1000
+    print(f'connections {opts.connections}, {len(ms)} requests in {elapsed:.1f}s, '
+          f'{len(errors)} errors')
+    print(f'QPS {len(ms) / elapsed:.0f}, p50 {np.percentile(ms, 50):.1f}ms, '
+          f'p99 {np.percentile(ms, 99):.1f}ms')
+    print(f'server: mean batch size {stats["mean_batch_size"]:.1f}, '
+          f'cache {stats["cache"]}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--connections', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--words', type=int, default=10000,
+                        help='Number of frequent words to query.')
+    parser.add_argument('--topn', type=int, default=10)
+    parser.add_argument('--analogies', action='store_true')
+    asyncio.run(main(parser.parse_args()))
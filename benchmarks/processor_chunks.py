@@ -0,0 +1,69 @@
+"""Compare the throughput of `Processor.process_all` with and without chunks.
+
+The corpus is synthetic: each article is a list of random Chinese and latin
+tokens, which is the shape of articles yielded by `WikiCorpus.get_texts`.
+
+Usage:
+    python -m benchmarks.processor_chunks --articles 50000 --workers 4
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from utils.processor import Processor, RemoveNonChineseWords, RemoveStopwords
+
+
+def synthetic_articles(n, tokens_per_article=300, seed=0):
+    rng = random.Random(seed)
+    chinese = [chr(c) for c in range(0x4e01, 0x4e01 + 3000)]
+    latin = 'abcdefghijklmnopqrstuvwxyz'
+    articles = []
+    for _ in range(n):
+        article = []
+        for _ in range(tokens_per_article):
+            if rng.random() < 0.1:
+                article.append(''.join(rng.choices(latin, k=rng.randint(2, 8))))
+            else:
+                article.append(''.join(rng.choices(chinese, k=rng.randint(1, 4))))
+        articles.append(article)
+    return articles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--articles', type=int, default=50000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--chunk_sizes', type=int, nargs='+', default=[1, 16, 64, 0],
+                        help='Chunk sizes to compare, 0 stands for adaptive.')
+    opts = parser.parse_args()
+
+    articles = synthetic_articles(opts.articles)
+    processor = Processor([
+        RemoveNonChineseWords(),
+        RemoveStopwords(stopwords=['的', '了', '是']),
+    ])
+    with tempfile.TemporaryDirectory() as folder:
+        output_path = os.path.join(folder, 'output.txt')
+        results = []
+        for chunk_size in opts.chunk_sizes:
+            start = time.perf_counter()
+            processor.process_all(
+                articles, output_path,
+                workers=opts.workers,
+                chunk_size=chunk_size or None,
+            )
+            elapsed = time.perf_counter() - start
+            results.append((chunk_size or 'adaptive', elapsed))
+
+    base = results[0][1]
+    print(f'{"chunk_size":>10} {"seconds":>8} {"articles/s":>11} {"speedup":>8}')
+    for chunk_size, elapsed in results:
+        print(f'{chunk_size:>10} {elapsed:>8.2f} {opts.articles / elapsed:>11.0f} '
+              f'{base / elapsed:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""Measure the cost of the ordered-output mode of `Processor.process_all`.
+
+Usage:
+    python -m benchmarks.processor_ordered --articles 50000 --workers 4
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.processor_chunks import synthetic_articles
+from utils.processor import Processor, RemoveNonChineseWords, RemoveStopwords
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--articles', type=int, default=50000)
+    parser.add_argument('--workers', type=int, default=4)
+    opts = parser.parse_args()
+
+    articles = synthetic_articles(opts.articles)
+    processor = Processor([
+        RemoveNonChineseWords(),
+        RemoveStopwords(stopwords=['的', '了', '是']),
+    ])
+    expected = [' '.join(processor.process(article)) for article in articles]
+
+    with tempfile.TemporaryDirectory() as folder:
+        output_path = os.path.join(folder, 'output.txt')
+        results = {}
+        for ordered in [False, True]:
+            start = time.perf_counter()
+            processor.process_all(articles, output_path,
+                                  workers=opts.workers, ordered=ordered)
+            results[ordered] = time.perf_counter() - start
+            with open(output_path, 'r') as f:
+                in_order = f.read().splitlines() == expected
+            print(f'ordered={ordered!s:>5}: {opts.articles / results[ordered]:>8.0f} '
+                  f'articles/s, output in input order: {in_order}')
+
+    print(f'cost of ordering: {results[True] / results[False] - 1:.1%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Memory, query latency and top-10 overlap of compressed exports.
+
+Uses the word vectors of a saved model, or synthetic clustered vectors if no
+model is given.
+
+Usage:
+    python -m benchmarks.quantization --model data/model/zhwiki_vs100w5mc5.model
+    python -m benchmarks.quantization --vocab 200000 --dim 100
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.ann_recall import synthetic_vectors
+from utils.mapped import DTYPES, MappedVectors, export_vectors
+from utils.similarity import top_k
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', type=str, default='')
+    parser.add_argument('--vocab', type=int, default=200000)
+    parser.add_argument('--dim', type=int, default=100)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--topn', type=int, default=10)
+    opts = parser.parse_args()
+
+    if opts.model:
+        from gensim.models import Word2Vec
+        model = Word2Vec.load(opts.model)
+        vectors, words = model.wv.vectors, model.wv.index2word
+    else:
+        vectors, words = synthetic_vectors(opts.vocab, opts.dim)
+
+    rng = np.random.RandomState(1)
+    query_ids = rng.choice(len(words), opts.queries, replace=False)
+    exclude = [[i] for i in query_ids]
+
+    expected = None
+    print(f'{"dtype":>8} {"MB":>8} {"ms/batch":>9} {"top-10 overlap":>15}')
+    with tempfile.TemporaryDirectory() as folder:
+        for dtype in DTYPES:
+            path = os.path.join(folder, dtype)
+            export_vectors(vectors, words, path, dtype)
+            mapped = MappedVectors.load(path)
+            queries = mapped.unit_rows(query_ids)
+            if expected is None:
+                reference = queries
+            start = time.perf_counter()
+            rows, _ = top_k(mapped.scores(reference), opts.topn, exclude)
+            elapsed = time.perf_counter() - start
+            if expected is None:
+                expected = rows
+            overlap = np.mean([
+                len(set(r) & set(e)) / opts.topn for r, e in zip(rows, expected)
+            ])
+            vector_bytes = mapped.nbytes() - sum(
+                mapped.arrays[name].nbytes for name in ['words', 'offsets', 'order'])
+            print(f'{dtype:>8} {vector_bytes / 2 ** 20:>8.1f} {elapsed * 1000:>9.1f} '
+                  f'{overlap:>15.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Compare `WikiCorpus.get_texts` with the parallel multistream reader.
+
+A synthetic multistream dump is generated with the same layout as the
+Wikipedia dumps: a stream with the site info, then streams of 100 pages.
+
+Usage:
+    python -m benchmarks.zhwiki_streams --pages 20000 --processes 4
+"""
+
+import argparse
+import bz2
+import os
+import random
+import tempfile
+import time
+
+from gensim.corpora import WikiCorpus
+
+from utils.wiki import wiki_articles
+
+HEADER = '''<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/" version="0.10" xml:lang="zh">
+  <siteinfo>
+    <sitename>Wikipedia</sitename>
+  </siteinfo>
+'''
+
+PAGE = '''  <page>
+    <title>{title}</title>
+    <ns>{ns}</ns>
+    <id>{id}</id>
+    <revision>
+      <id>{id}</id>
+      <text xml:space="preserve">{text}</text>
+    </revision>
+  </page>
+'''
+
+
+def write_dump(path, pages, seed=0):
+    rng = random.Random(seed)
+    words = [''.join(chr(rng.randint(0x4e01, 0x9ffe)) for _ in range(rng.randint(2, 4)))
+             for _ in range(5000)]
+    with open(path, 'wb') as f:
+        f.write(bz2.compress(HEADER.encode()))
+        for start in range(0, pages, 100):
+            stream = []
+            for i in range(start, min(start + 100, pages)):
+                ns = '0' if rng.random() < 0.9 else '10'
+                text = ' '.join(rng.choices(words, k=rng.randint(20, 400)))
+                text += ' [[链接|文字]] {{模板}} <ref>引用</ref>'
+                stream.append(PAGE.format(title=f'条目{i}', ns=ns, id=i, text=text))
+            if start + 100 >= pages:
+                stream.append('</mediawiki>\n')
+            f.write(bz2.compress(''.join(stream).encode()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=20000)
+    parser.add_argument('--processes', type=int, default=4)
+    opts = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'dump.xml.bz2')
+        write_dump(path, opts.pages)
+
+        start = time.perf_counter()
+        expected = list(WikiCorpus(path, dictionary={}, processes=opts.processes).get_texts())
+        wikicorpus_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = list(wiki_articles(path, processes=opts.processes))
+        streams_time = time.perf_counter() - start
+
+    print(f'articles: {len(actual)}, identical output: {actual == expected}')
+    print(f'WikiCorpus.get_texts: {wikicorpus_time:.2f}s')
+    print(f'wiki_articles:        {streams_time:.2f}s '
+          f'({wikicorpus_time / streams_time:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Evaluate trained models on analogy and word similarity datasets.
+
+By default every model in `settings.MODEL_FOLDER` is evaluated on every file
+in `settings.EVALUATION_FOLDER`/analogy and /similarity, see
+`utils/evaluation.py` for the file formats.
+
+Example:
+    python evaluate.py --analogies data/evaluation/analogy/ca8_morphological.txt
+"""
+
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+import settings
+from utils.evaluation import (evaluate_analogies, evaluate_similarities,
+                              load_analogies, load_similarities)
+from utils.similarity import unit_vectors
+
+logger = settings.LOGGER
+
+
+def load_unit_vectors(model_path, restrict_vocab):
+    """Unit vectors of the `restrict_vocab` most frequent words of a model,
+    with the row of each word.
+    """
+    from gensim.models import Word2Vec
+    wv = Word2Vec.load(model_path).wv
+    words = wv.index2word[:restrict_vocab]
+    unit = unit_vectors(wv.vectors[:len(words)])
+    return unit, {w: i for i, w in enumerate(words)}
+
+
+def evaluate(opts):
+    analogies = {
+        os.path.basename(path): load_analogies(path) for path in opts.analogies}
+    similarities = {
+        os.path.basename(path): load_similarities(path) for path in opts.similarities}
+    if not analogies and not similarities:
+        logger.error(f'No datasets given or found in {settings.EVALUATION_FOLDER}')
+        return
+
+    header = ['model', 'dataset', 'category', 'metric', 'score', 'count', 'skipped']
+    rows = []
+    for model_path in opts.models:
+        model = os.path.basename(model_path)
+        start = time.time()
+        unit, index = load_unit_vectors(model_path, opts.restrict_vocab)
+        loaded = time.time()
+        for dataset, categories in analogies.items():
+            total = {'correct': 0, 'count': 0, 'skipped': 0}
+            for category, questions in categories.items():
+                result = evaluate_analogies(unit, index, questions, opts.batch_size)
+                for key in total:
+                    total[key] += result[key]
+                rows.append([model, dataset, category, 'accuracy',
+                             f'{result["accuracy"]:.4f}', result['count'],
+                             result['skipped']])
+            accuracy = total['correct'] / total['count'] if total['count'] else np.nan
+            rows.append([model, dataset, 'total', 'accuracy', f'{accuracy:.4f}',
+                         total['count'], total['skipped']])
+        for dataset, pairs in similarities.items():
+            result = evaluate_similarities(unit, index, pairs)
+            rows.append([model, dataset, 'total', 'spearman',
+                         f'{result["spearman"]:.4f}', result['count'], result['skipped']])
+        logger.info(f'Evaluated {model} in {time.time() - loaded:.1f}s '
+                    f'(loaded in {loaded - start:.1f}s)')
+
+    rows = [[str(x) for x in row] for row in rows]
+    for row in [header] + rows:
+        logger.info(' | '.join(row))
+    with open(opts.output, 'w') as f:
+        for row in [header] + rows:
+            f.write('\t'.join(row) + '\n')
+    logger.info(f'Saved evaluation to {opts.output}')
+
+
+def get_evaluate_options(args=None):
+    parser = argparse.ArgumentParser(
+        description='Evaluate Chinese Word2Vec models on analogies and similarities',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        '--models', type=str, nargs='+',
+        default=sorted(glob.glob(os.path.join(settings.MODEL_FOLDER, '*.model'))),
+        help='Paths to saved Word2Vec models.'
+    )
+    parser.add_argument(
+        '--analogies', type=str, nargs='*',
+        default=sorted(glob.glob(
+            os.path.join(settings.EVALUATION_FOLDER, 'analogy', '*.txt'))),
+        help='Analogy files in the format of questions-words.txt.'
+    )
+    parser.add_argument(
+        '--similarities', type=str, nargs='*',
+        default=sorted(glob.glob(
+            os.path.join(settings.EVALUATION_FOLDER, 'similarity', '*.txt'))),
+        help='Word similarity files with lines "word1 word2 score".'
+    )
+    parser.add_argument(
+        '--restrict_vocab', type=int, default=300000,
+        help='Only use the most frequent words, as KeyedVectors.evaluate_word_analogies.'
+    )
+    parser.add_argument(
+        '--batch_size', type=int, default=128,
+        help='Number of analogy questions answered by one matrix product.'
+    )
+    parser.add_argument(
+        '--output', type=str,
+        default=os.path.join(settings.MODEL_FOLDER, 'evaluation.tsv'),
+        help='Path of the summary table.'
+    )
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    opts = get_evaluate_options()
+    evaluate(opts)
@@ -3,10 +3,12 @@ import os
 
 import settings
 from train import get_train_options, train
-from utils import unzip
+from utils import iter_zip_lines, unzip
 from utils.download import download_gdoc
-from utils.processor import (CutSentence, Processor, RemoveNonChineseWords,
-                             RemoveStopwords)
+from utils.processor import (CutSentence, Deduplicate, Processor,
+                             RemoveNonChineseWords, RemoveStopwords,
+                             subsample_corpus)
+from utils.shard import LineArticles
 
 logger = settings.LOGGER
 
@@ -22,6 +24,9 @@ def download_news2016zh():
 
 
 def unzip_news2016zh():
+    if settings.NEWS2016ZH_STREAM_FROM_ZIP:
+        logger.info('news2016zh is streamed from the zip archive. Skip decompressing.')
+        return
     path = settings.NEWS2016ZH_PATH
     if os.path.exists(path):
         logger.info(f'news2016zh already decompressed.')
@@ -33,39 +38,91 @@ def unzip_news2016zh():
     logger.info(f'news2016zh decompressed to {folder}')
 
 
+def parse_line(line):
+    return [json.loads(line)['content']]
+
+
 def article_gen(path):
     with open(path, 'r') as f:
         for line in f:
-            article = json.loads(line)['content']
-            yield [article]
+            yield parse_line(line)
+
+
+def zip_article_gen(zip_path):
+    name = os.path.basename(settings.NEWS2016ZH_PATH)
+    for line in iter_zip_lines(zip_path, name):
+        yield parse_line(line)
 
 
 def preprocess_news2016zh():
     input_path = settings.NEWS2016ZH_PATH
     output_path = settings.NEWS2016ZH_CLEANED_PATH
-    if os.path.exists(output_path):
+    if os.path.exists(output_path) and not settings.INCREMENTAL_PREPROCESS:
         logger.info(f'{output_path} existed. Skip preprocess.')
         logger.info(f'Delete {output_path} if preprocess needs to be redone.')
         return
-    processor = Processor(
-        pipelines=[
-            CutSentence(),
-            RemoveNonChineseWords(),
-            RemoveStopwords(),
-        ],
-    )
-    processor.process_all(article_gen(input_path), output_path)
+    pipelines = [
+        CutSentence(cache_size=settings.PIPELINE_CACHE_SIZE),
+        RemoveNonChineseWords(),
+        RemoveStopwords(),
+    ]
+    if settings.NEWS2016ZH_DEDUP:
+        pipelines.append(Deduplicate())
+    processor = Processor(pipelines=pipelines)
+    if settings.INCREMENTAL_PREPROCESS:
+        if settings.NEWS2016ZH_STREAM_FROM_ZIP:
+            articles = zip_article_gen(settings.NEWS2016ZH_ZIP_PATH)
+        else:
+            articles = article_gen(input_path)
+        processor.process_incremental(
+            articles, f'{output_path}.incremental', merge_path=output_path)
+    elif settings.NEWS2016ZH_STREAM_FROM_ZIP:
+        articles = zip_article_gen(settings.NEWS2016ZH_ZIP_PATH)
+        processor.process_all(
+            articles, output_path, resumable=True,
+            profile=settings.PROCESSOR_PROFILE,
+            profile_path=f'{output_path}.profile.json')
+    elif settings.NEWS2016ZH_SHARDED:
+        processor.process_shards(input_path, parse_line, output_path)
+    else:
+        processor.process_all(
+            LineArticles(input_path, parse_line), output_path, resumable=True,
+            profile=settings.PROCESSOR_PROFILE,
+            profile_path=f'{output_path}.profile.json')
+
+
+def subsample_news2016zh():
+    if not (settings.PREPROCESS_SUBSAMPLE or settings.PREPROCESS_MAX_SENTENCE_LENGTH):
+        return
+    input_path = settings.NEWS2016ZH_CLEANED_PATH
+    output_path = settings.NEWS2016ZH_SUBSAMPLED_PATH
+    if os.path.exists(output_path) and \
+            os.path.getmtime(output_path) > os.path.getmtime(input_path):
+        logger.info(f'{output_path} existed. Skip subsample.')
+        return
+    subsample_corpus(
+        input_path, output_path, settings.PREPROCESS_SUBSAMPLE,
+        vocab_path=f'{input_path}.vocab.tsv',
+        max_sentence_length=settings.PREPROCESS_MAX_SENTENCE_LENGTH,
+        min_count=get_train_options().min_count)
 
 
 def train_news2016zh():
     opts = get_train_options()
     opts.input_file = settings.NEWS2016ZH_CLEANED_PATH
+    if settings.PREPROCESS_SUBSAMPLE or settings.PREPROCESS_MAX_SENTENCE_LENGTH:
+        opts.input_file = settings.NEWS2016ZH_SUBSAMPLED_PATH
+    if settings.PREPROCESS_SUBSAMPLE:
+        opts.sample = 0
     opts.name_prefix = 'news2016zh'
     train(opts)
 
 
 if __name__ == '__main__':
+    if settings.LOGGER_QUEUE:
+        logger.start_queue()
     download_news2016zh()
     unzip_news2016zh()
     preprocess_news2016zh()
+    subsample_news2016zh()
     train_news2016zh()
@@ -0,0 +1,77 @@
+"""Detect phrases in a cleaned corpus and rewrite it with joined phrases.
+
+Example:
+    python phrases.py --input_file data/cleaned/news2016zh.txt
+    python train.py --input_folder data/cleaned/news2016zh_phrases --name_prefix news2016zh_phrases
+"""
+
+import argparse
+import os
+import time
+
+import settings
+from utils.phrases import (count_ngrams, find_phrases, load_phrases,
+                           rewrite_corpus, save_phrases)
+
+logger = settings.LOGGER
+
+
+def phrases(opts):
+    source = opts.input_folder or opts.input_file
+    folder = opts.output_folder or \
+        f'{os.path.splitext(source.rstrip(os.sep))[0]}_phrases'
+    phrases_path = f'{folder}.tsv'
+
+    if os.path.exists(phrases_path) and not opts.recount:
+        logger.info(f'Loading phrases from {phrases_path} ...')
+        found = load_phrases(phrases_path)
+    else:
+        logger.info(f'Counting unigrams and bigrams of {source} ...')
+        start = time.time()
+        counts = count_ngrams(source, opts.workers, opts.max_size)
+        logger.info(f'Counted {len(counts)} unigrams and bigrams in '
+                    f'{time.time() - start:.1f}s')
+        found = find_phrases(counts, opts.min_count, opts.threshold)
+        save_phrases(phrases_path, found)
+        logger.info(f'Saved {len(found)} phrases to {phrases_path}')
+
+    logger.info(f'Rewriting {source} into {folder} ...')
+    start = time.time()
+    joined = rewrite_corpus(source, folder, found, opts.workers, opts.delimiter)
+    logger.info(f'Joined {joined} phrases in {time.time() - start:.1f}s')
+
+
+def get_phrases_options(args=None):
+    parser = argparse.ArgumentParser(
+        description='Detect phrases and rewrite a corpus with them',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument('--input_file', '-i', type=str, default='',
+                        help='Cleaned corpus, one sentence or article per line.')
+    parser.add_argument('--input_folder', type=str, default='',
+                        help='Folder of cleaned corpus files.')
+    parser.add_argument('--output_folder', '-o', type=str, default='',
+                        help='Folder of the rewritten shards. Defaults to '
+                        '{input}_phrases, with the phrases saved to {folder}.tsv.')
+    parser.add_argument('--min_count', type=int, default=5,
+                        help='Bigrams counted less often are ignored.')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Score threshold of phrases, as gensim Phrases.')
+    parser.add_argument('--max_size', type=int, default=10000000,
+                        help='Maximum number of entries of the count table.')
+    parser.add_argument('--delimiter', type=str, default='_',
+                        help='Delimiter of the tokens of a phrase, which must '
+                        'not appear in tokens.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of processes. Defaults to the number of cpus.')
+    parser.add_argument('--recount', action='store_true',
+                        help='Count again even if the phrases file exists.')
+    opts = parser.parse_args(args)
+    if not (opts.input_file or opts.input_folder):
+        parser.error('one of --input_file or --input_folder is required')
+    return opts
+
+
+if __name__ == '__main__':
+    opts = get_phrases_options()
+    phrases(opts)
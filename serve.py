@@ -0,0 +1,220 @@
+"""Serve similarity and analogy queries over HTTP on localhost.
+
+Concurrent requests are micro-batched: queries arriving within `--max_delay`
+milliseconds, up to `--max_batch` of them, are answered with one scoring
+pass in a worker thread, while the event loop keeps accepting requests.
+
+Endpoints:
+
+- `POST /query` with a query object (see `utils/query.py`), optionally with
+  `topn`, or `{"queries": [...], "topn": 10}` for a batch.
+- `GET /words?limit=1000`: the most frequent words.
+- `GET /stats`: cache and batching statistics.
+
+Example:
+    python serve.py --model data/model/zhwiki_vs100w5mc5.model
+    curl -d '{"analogy": ["男", "国王", "女"], "topn": 5}' localhost:8000/query
+"""
+
+import argparse
+import asyncio
+import json
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import settings
+from utils.query import QueryEngine, parse_query
+
+logger = settings.LOGGER
+
+MAX_BODY_SIZE = 1 << 20
+# result of queries whose batch failed, answered with 500 instead of 404
+INTERNAL_ERROR = {'error': 'internal error'}
+
+
+class Batcher:
+    """Collects queries into micro-batches for a `QueryEngine`.
+
+    Args:
+        engine (QueryEngine): Engine answering the batches.
+        max_batch (int): Largest number of queries in a batch.
+        max_delay (float): Longest wait in seconds for a batch to fill up.
+    """
+
+    def __init__(self, engine: QueryEngine, max_batch: int, max_delay: float):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.queries = 0
+
+    async def submit(self, query, topn):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((query, topn, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.batches += 1
+            self.queries += len(batch)
+            by_topn = {}
+            for item in batch:
+                by_topn.setdefault(item[1], []).append(item)
+            for topn, items in by_topn.items():
+                try:
+                    results = await loop.run_in_executor(
+                        None, self.engine.query_batch, [q for q, _, _ in items], topn)
+                except Exception as e:
+                    logger.error(f'Batch of {len(items)} queries failed: {e}')
+                    results = [INTERNAL_ERROR] * len(items)
+                for (_, _, future), result in zip(items, results):
+                    if not future.done():
+                        future.set_result(result)
+
+    def stats(self):
+        return {
+            'batches': self.batches, 'queries': self.queries,
+            'mean_batch_size': self.queries / max(self.batches, 1),
+            'cache': self.engine.cache_info(),
+        }
+
+
+class Server:
+    """A minimal HTTP/1.1 server with keep-alive, on `asyncio` streams."""
+
+    def __init__(self, batcher: Batcher, default_topn: int):
+        self.batcher = batcher
+        self.default_topn = default_topn
+
+    async def handle(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == '/query' and method == 'POST':
+            try:
+                obj = json.loads(body)
+                topn = int(obj.get('topn', self.default_topn))
+                if 'queries' in obj:
+                    queries = [parse_query(q) for q in obj['queries']]
+                else:
+                    queries = [parse_query(obj)]
+            except (ValueError, TypeError, AttributeError) as e:
+                return HTTPStatus.BAD_REQUEST, {'error': str(e)}
+            results = await asyncio.gather(
+                *(self.batcher.submit(q, topn) for q in queries))
+            if any(result is INTERNAL_ERROR for result in results):
+                status = HTTPStatus.INTERNAL_SERVER_ERROR
+            elif 'queries' not in obj and 'error' in results[0]:
+                status = HTTPStatus.NOT_FOUND
+            else:
+                status = HTTPStatus.OK
+            if 'queries' in obj:
+                return status, {'results': results}
+            return status, results[0]
+        if url.path == '/words' and method == 'GET':
+            try:
+                limit = int(parse_qs(url.query).get('limit', ['1000'])[0])
+            except ValueError:
+                return HTTPStatus.BAD_REQUEST, {'error': 'limit must be an integer'}
+            vectors = self.batcher.engine.vectors
+            return HTTPStatus.OK, {
+                'words': [vectors.word(i) for i in range(min(limit, len(vectors)))]}
+        if url.path == '/stats' and method == 'GET':
+            return HTTPStatus.OK, self.batcher.stats()
+        return HTTPStatus.NOT_FOUND, {'error': f'no route {method} {url.path}'}
+
+    async def serve_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_SIZE:
+                    status, response = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {}
+                    headers['connection'] = 'close'
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    try:
+                        status, response = await self.handle(method, target, body)
+                    except Exception as e:
+                        logger.error(f'{method} {target} failed: {e}')
+                        status, response = HTTPStatus.INTERNAL_SERVER_ERROR, INTERNAL_ERROR
+                payload = json.dumps(response, ensure_ascii=False).encode('utf-8')
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(
+                    f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+                    'Content-Type: application/json; charset=utf-8\r\n'
+                    f'Content-Length: {len(payload)}\r\n'
+                    f'Connection: {"keep-alive" if keep_alive else "close"}\r\n'
+                    '\r\n'.encode('latin-1') + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(opts):
+    engine = QueryEngine.load(opts.model, cache_size=opts.cache_size)
+    batcher = Batcher(engine, opts.max_batch, opts.max_delay / 1000)
+    server = Server(batcher, opts.topn)
+    batch_task = asyncio.create_task(batcher.run())
+    http = await asyncio.start_server(server.serve_connection, opts.host, opts.port)
+    logger.info(f'Serving {len(engine.vectors)} words of {opts.model} '
+                f'on http://{opts.host}:{opts.port}')
+    try:
+        async with http:
+            await http.serve_forever()
+    finally:
+        batch_task.cancel()
+
+
+def get_serve_options(args=None):
+    parser = argparse.ArgumentParser(
+        description='Serve similarity and analogy queries over HTTP',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument('--model', '-m', type=str, required=True,
+                        help='Path to a saved Word2Vec model, or to an export '
+                        'folder of its vectors, see vectors.py export.')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--topn', type=int, default=10,
+                        help='Number of results of queries without topn.')
+    parser.add_argument('--max_batch', type=int, default=64,
+                        help='Largest number of queries answered together. '
+                        '1 disables batching.')
+    parser.add_argument('--max_delay', type=float, default=2,
+                        help='Longest wait in milliseconds for a batch to fill up.')
+    parser.add_argument('--cache_size', type=int, default=10000,
+                        help='Number of cached query results. 0 disables the cache.')
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    opts = get_serve_options()
+    try:
+        asyncio.run(serve(opts))
+    except KeyboardInterrupt:
+        pass
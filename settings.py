@@ -8,25 +8,57 @@ HERE = os.path.dirname(os.path.realpath(__file__))
 FOLDER = os.path.join(HERE, 'data')
 CLEANED_FOLDER = os.path.join(FOLDER, 'cleaned')
 MODEL_FOLDER = os.path.join(FOLDER, 'model')
+# analogy/*.txt and similarity/*.txt datasets of evaluate.py
+EVALUATION_FOLDER = os.path.join(FOLDER, 'evaluation')
 
 for folder in [FOLDER, CLEANED_FOLDER, MODEL_FOLDER]:
     if not os.path.exists(folder):
         os.mkdir(folder)
 
 # zhwiki
-ZHWIKI_URL = 'https://dumps.wikimedia.org/zhwiki/latest/zhwiki-latest-pages-articles.xml.bz2'
+# the multistream dump can be decompressed in parallel, see utils/wiki.py
+ZHWIKI_URL = 'https://dumps.wikimedia.org/zhwiki/latest/zhwiki-latest-pages-articles-multistream.xml.bz2'
 ZHWIKI_PATH = os.path.join(
     FOLDER,
-    'zhwiki-latest-pages-articles.xml.bz2'
+    'zhwiki-latest-pages-articles-multistream.xml.bz2'
 )
 ZHWIKI_CLEANED_PATH = os.path.join(CLEANED_FOLDER, 'zhwiki.txt')
+ZHWIKI_SUBSAMPLED_PATH = os.path.join(CLEANED_FOLDER, 'zhwiki.subsampled.txt')
 
 # news2016zh
 NEWS2016ZH_FILE_ID = '1TMKu1FpTr6kcjWXWlQHX7YJsMfhhcVKp'
 NEWS2016ZH_ZIP_PATH = os.path.join(FOLDER, 'news2016zh.zip')
 NEWS2016ZH_PATH = os.path.join(FOLDER, 'news2016zh_train.json')
 NEWS2016ZH_CLEANED_PATH = os.path.join(CLEANED_FOLDER, 'news2016zh.txt')
+NEWS2016ZH_SUBSAMPLED_PATH = os.path.join(CLEANED_FOLDER, 'news2016zh.subsampled.txt')
+# each worker parses its own byte range of the json file. Shards are neither
+# resumable nor ordered, and are not profiled.
+NEWS2016ZH_SHARDED = False
+# read the json file directly from the zip archive, without decompressing it
+# to disk. It takes precedence over NEWS2016ZH_SHARDED.
+NEWS2016ZH_STREAM_FROM_ZIP = False
+# drop near-duplicate (syndicated) news articles, see utils/dedup.py. It cannot
+# be combined with INCREMENTAL_PREPROCESS.
+NEWS2016ZH_DEDUP = False
 
+# size of the per-worker LRU caches of CutSentence and ConvertT2S, 0 to disable
+PIPELINE_CACHE_SIZE = 0
+# process only new or changed articles of refreshed dumps, keeping the shards
+# and content hashes of previous runs in {cleaned path}.incremental, see
+# utils/incremental.py. It takes precedence over NEWS2016ZH_SHARDED.
+INCREMENTAL_PREPROCESS = False
+
+# downsample the frequent tokens of the cleaned corpora once, with this
+# threshold as the sample of word2vec, into {name}.subsampled.txt, which is then
+# trained on with --sample 0. 0 disables it.
+PREPROCESS_SUBSAMPLE = 0
+# split the lines of {name}.subsampled.txt into sentences of at most this many
+# tokens, also without subsampling. None keeps one article per line.
+PREPROCESS_MAX_SENTENCE_LENGTH = None
+
+# log per-stage timings of Processor.process_all and save their summary next
+# to the cleaned corpus as {path}.profile.json
+PROCESSOR_PROFILE = False
 
 # stopwords
 STOPWORDS_URL = 'https://raw.githubusercontent.com/stopwords-iso/stopwords-zh/master/stopwords-zh.json'
@@ -34,5 +66,13 @@ STOPWORDS_PATH = os.path.join(FOLDER, 'stopwords.json')
 
 # logger
 LOGGER_PATH = os.path.join(FOLDER, 'log.txt')
+# JSON lines of the metrics of training epochs and profiles
+METRICS_PATH = os.path.join(FOLDER, 'metrics.jsonl')
+# let news2016zh.py and zhwiki.py write the records of all preprocessing
+# processes from one listener thread, see BaseLogger.start_queue. It keeps
+# logging out of the workers, but the listener formats every record in a
+# single thread, which can be slower on few cpus.
+LOGGER_QUEUE = False
 LOGGER = FileLogger(LOGGER_PATH, name='word2vec', level=logging.INFO)
-LOGGER.log_to_stdout()
\ No newline at end of file
+LOGGER.log_to_stdout()
+LOGGER.log_metrics_to(METRICS_PATH)
\ No newline at end of file
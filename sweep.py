@@ -0,0 +1,105 @@
+import copy
+import itertools
+import os
+from multiprocessing import Pool, cpu_count
+
+import settings
+from train import get_train_parser, get_vocab, prepare_corpus, train
+
+logger = settings.LOGGER
+
+
+def get_sweep_options():
+    parser = get_train_parser()
+    parser.description = 'Train Chinese Word2Vec over a grid of hyperparameters'
+    parser.add_argument(
+        '--vector_sizes', type=int, nargs='+', default=[100],
+        help='Grid of --vector_size.'
+    )
+    parser.add_argument(
+        '--windows', type=int, nargs='+', default=[5],
+        help='Grid of --window.'
+    )
+    parser.add_argument(
+        '--min_counts', type=int, nargs='+', default=[5],
+        help='Grid of --min_count.'
+    )
+    parser.add_argument(
+        '--cpu_budget', type=int, default=cpu_count(),
+        help='Total number of worker threads shared by the concurrent runs.'
+    )
+    parser.add_argument(
+        '--concurrent_runs', type=int, default=1,
+        help='Number of trainings running at the same time.'
+    )
+    return parser.parse_args()
+
+
+def _train(opts):
+    return opts, train(opts)
+
+
+def sweep(opts):
+    """Train a model for every combination of the grid.
+
+    The corpus is prepared and its vocab is counted once, then every run
+    loads the shared vocab artifact instead of scanning the corpus. Runs are
+    executed `concurrent_runs` at a time, each with an equal share of
+    `cpu_budget` worker threads.
+    """
+    if opts.input_file == '' and opts.input_folder == '':
+        logger.error('Please specify either an input file or an input foler!')
+        return
+
+    # shared corpus and vocab
+    if opts.vocab_file == '':
+        opts.vocab_file = os.path.join(
+            settings.MODEL_FOLDER, f'{opts.name_prefix}.vocab.tsv')
+    prepare_corpus(opts)
+    get_vocab(opts.input_folder or opts.input_file, opts.vocab_file)
+
+    concurrent_runs = max(opts.concurrent_runs, 1)
+    workers = max(opts.cpu_budget // concurrent_runs, 1)
+    runs = []
+    for vs, w, mc in itertools.product(
+            opts.vector_sizes, opts.windows, opts.min_counts):
+        run = copy.copy(opts)
+        run.vector_size, run.window, run.min_count = vs, w, mc
+        run.workers = workers
+        runs.append(run)
+    logger.info(
+        f'Sweep of {len(runs)} runs, {concurrent_runs} at a time '
+        f'with {workers} workers each.'
+    )
+
+    results = []
+    with Pool(concurrent_runs, maxtasksperchild=1) as pool:
+        for run, result in pool.imap(_train, runs):
+            results.append((run, result))
+
+    # summary table
+    path = os.path.join(settings.MODEL_FOLDER, f'{opts.name_prefix}_sweep.tsv')
+    header = ['vector_size', 'window', 'min_count', 'workers',
+              'vocab_size', 'seconds', 'words_per_sec', 'model']
+    rows = []
+    for run, result in results:
+        row = [run.vector_size, run.window, run.min_count, run.workers]
+        if result is None:
+            row += ['', '', '', 'failed']
+        else:
+            row += [
+                result['vocab_size'], f'{result["seconds"]:.1f}',
+                f'{result["words_per_sec"]:.0f}', os.path.basename(result['path']),
+            ]
+        rows.append([str(x) for x in row])
+    with open(path, 'w') as f:
+        for row in [header] + rows:
+            f.write('\t'.join(row) + '\n')
+    for row in [header] + rows:
+        logger.info(' | '.join(row))
+    logger.info(f'Saved sweep summary to {path}')
+
+
+if __name__ == '__main__':
+    opts = get_sweep_options()
+    sweep(opts)
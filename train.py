@@ -1,41 +1,272 @@
 import argparse
+import copy
 import logging
 import os
+import re
+import shutil
+import threading
+import time
+
+import numpy as np
 
 from gensim.models import Word2Vec
 from gensim.models.word2vec import LineSentence, PathLineSentences
 from gensim.models.callbacks import CallbackAny2Vec
+from gensim.utils import SaveLoad
 
 import settings
+from utils.corpus import (BinarySentences, concat_text_files,
+                          is_binary_corpus, text_to_binary)
+from utils.mapped import DTYPES, export_vectors
+from utils.similarity import most_similar, unit_vectors
+from utils.vocab import count_vocab, is_vocab_of, load_vocab, save_vocab
 
 logger = settings.LOGGER
 
 
+def _snapshot(obj):
+    """Shallow copy of `obj` with copies of its numpy arrays and snapshots of
+    its gensim sub-objects, such as `wv`, `vocabulary` and `trainables`, which
+    `save` modifies while it writes them.
+    """
+    snapshot = copy.copy(obj)
+    for key, value in vars(obj).items():
+        if isinstance(value, np.ndarray):
+            setattr(snapshot, key, value.copy())
+        elif isinstance(value, SaveLoad):
+            setattr(snapshot, key, _snapshot(value))
+    return snapshot
+
+
+def latest_checkpoint(checkpoint_path):
+    """Path to the model of the latest complete checkpoint in the folder
+    `checkpoint_path`, or None.
+    """
+    if not os.path.isdir(checkpoint_path):
+        return None
+    epochs = [
+        int(name[6:]) for name in os.listdir(checkpoint_path)
+        if re.fullmatch(r'epoch-\d+', name)
+    ]
+    if not epochs:
+        return None
+    return os.path.join(checkpoint_path, f'epoch-{max(epochs)}', 'model')
+
+
 class TrainLogger(CallbackAny2Vec):
+    """Log training progress, and save checkpoints of the model.
 
-    def __init__(self):
-        self.epoch = 0
+    A checkpoint is the model saved with the attribute `train_checkpoint`,
+    recording the finished epochs and the learning rate schedule, so that
+    training can be resumed by `train(opts)` with `--resume`. gensim saves
+    large arrays next to the model, so each checkpoint is written into a
+    temporary folder, which is renamed to `epoch-{k}` in the checkpoint folder
+    once complete, and the older checkpoints are then removed. To keep workers
+    waiting as briefly as possible, only the numpy arrays are copied at the end
+    of an epoch, and the copy is saved in a background thread.
+
+    At the end of each epoch, the most similar words of `test_words` are
+    probed with one batched matrix product, in a background thread on a copy
+    of the word vectors, together with the vocab coverage of `test_words`
+    and the latency of the probe.
+
+    Args:
+        checkpoint_path (str, optional): Folder of the checkpoints. Defaults to
+            None, which disables checkpoints.
+        checkpoint_epochs (int, optional): Save a checkpoint every these many
+            epochs. Defaults to 0, disabled.
+        checkpoint_minutes (float, optional): Save a checkpoint at the end of an
+            epoch if these many minutes passed since the last one. Defaults to 0,
+            disabled.
+        schedule (dict, optional): Finished epochs, total epochs and learning
+            rates of the whole training, see `train`. Defaults to None.
+        test_words (List[str], optional): Words to probe at the end of each
+            epoch. Defaults to None, a few common words.
+    """
+
+    def __init__(self, checkpoint_path=None,
+                 checkpoint_epochs=0, checkpoint_minutes=0,
+                 schedule=None, test_words=None):
+        self.schedule = schedule or {'epoch': 0}
+        self.epoch = self.schedule['epoch']
         self.loss_prev = 0.0
-        self.test_words = ['学习', '国家', '汽车', '狗', '高兴']
+        self.test_words = test_words or ['学习', '国家', '汽车', '狗', '高兴']
+        self.probe_thread = None
+        self.epoch_start = None
+        self.words_per_sec = []
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_epochs = checkpoint_epochs
+        self.checkpoint_minutes = checkpoint_minutes
+        self.checkpoint_time = time.perf_counter()
+        self.checkpoint_thread = None
 
     def on_train_begin(self, model):
         logger.info(f'Training begins ...')
 
     def on_train_end(self, model):
-        logger.info(f'Training ends.')
+        self.wait_probe()
+        self.wait_checkpoint()
+        if self.words_per_sec:
+            average = sum(self.words_per_sec) / len(self.words_per_sec)
+            logger.info(f'Training ends with {average:.0f} words/s on average.')
+        else:
+            logger.info(f'Training ends.')
 
     def on_epoch_begin(self, model):
         self.epoch += 1
+        self.epoch_start = time.perf_counter()
         logger.info(f'Epoch {self.epoch} begins ...')
 
     def on_epoch_end(self, model):
+        elapsed = time.perf_counter() - self.epoch_start
+        words_per_sec = model.corpus_total_words / max(elapsed, 1e-9)
+        self.words_per_sec.append(words_per_sec)
         running_loss = model.get_latest_training_loss()
         loss = running_loss - self.loss_prev
         self.loss_prev = running_loss
-        logger.info(f'Epoch {self.epoch} ends with loss: {loss:.4f}.')
-        for word in self.test_words:
-            similar_words = model.wv.most_similar(word, topn=5)
+        logger.info(
+            f'Epoch {self.epoch} ends with loss: {loss:.4f}, '
+            f'in {elapsed:.1f}s, {words_per_sec:.0f} words/s.'
+        )
+        logger.metrics('epoch', {
+            'epoch': self.epoch, 'loss': loss,
+            'seconds': elapsed, 'words_per_sec': words_per_sec,
+        })
+        self.probe(model)
+        if self.should_checkpoint():
+            self.checkpoint(model)
+
+    def probe(self, model, topn=5):
+        """Start probing the most similar words of `self.test_words` in a
+        background thread.
+        """
+        self.wait_probe()
+        vocab = model.wv.vocab
+        words = [w for w in self.test_words if w in vocab]
+        query_ids = [vocab[w].index for w in words]
+        vectors = model.wv.vectors.copy()
+        self.probe_thread = threading.Thread(
+            target=self._probe,
+            args=(self.epoch, vectors, model.wv.index2word, words, query_ids, topn)
+        )
+        self.probe_thread.start()
+
+    def _probe(self, epoch, vectors, index2word, words, query_ids, topn):
+        start = time.perf_counter()
+        unit = unit_vectors(vectors)
+        results = most_similar(unit, query_ids, topn, words=index2word)
+        latency = time.perf_counter() - start
+        for word, similar_words in zip(words, results):
             logger.info(f'Similar words of {word}: {similar_words}')
+        logger.info(
+            f'Epoch {epoch} probe: {len(words)}/{len(self.test_words)} test words '
+            f'in vocab, {latency * 1000:.1f}ms.'
+        )
+
+    def wait_probe(self):
+        if self.probe_thread is not None:
+            self.probe_thread.join()
+            self.probe_thread = None
+
+    def should_checkpoint(self):
+        if self.checkpoint_path is None:
+            return False
+        if self.epoch >= self.schedule.get('epochs', float('inf')):
+            return False
+        if self.checkpoint_epochs and self.epoch % self.checkpoint_epochs == 0:
+            return True
+        minutes = (time.perf_counter() - self.checkpoint_time) / 60
+        return bool(self.checkpoint_minutes) and minutes >= self.checkpoint_minutes
+
+    def checkpoint(self, model):
+        """Snapshot the model and save it in a background thread.
+        """
+        self.wait_checkpoint()
+        snapshot = _snapshot(model)
+        snapshot.callbacks = ()
+        snapshot.train_checkpoint = dict(self.schedule, epoch=self.epoch)
+        self.checkpoint_time = time.perf_counter()
+        self.checkpoint_thread = threading.Thread(
+            target=self._save_checkpoint, args=(snapshot, self.epoch))
+        self.checkpoint_thread.start()
+
+    def _save_checkpoint(self, snapshot, epoch):
+        folder = os.path.join(self.checkpoint_path, f'epoch-{epoch}')
+        tmp_folder = f'{folder}.tmp'
+        if os.path.exists(tmp_folder):
+            shutil.rmtree(tmp_folder)
+        os.makedirs(tmp_folder)
+        snapshot.save(os.path.join(tmp_folder, 'model'))
+        if os.path.exists(folder):
+            shutil.rmtree(folder)
+        os.replace(tmp_folder, folder)
+        for name in os.listdir(self.checkpoint_path):
+            if name != f'epoch-{epoch}':
+                shutil.rmtree(os.path.join(self.checkpoint_path, name))
+        logger.info(f'Saved checkpoint of epoch {epoch} to {folder}')
+
+    def wait_checkpoint(self):
+        if self.checkpoint_thread is not None:
+            self.checkpoint_thread.join()
+            self.checkpoint_thread = None
+
+
+def get_vocab(source, vocab_file, workers=None):
+    """Load the vocab artifact at `vocab_file`, or count the vocab of `source`
+    in parallel and save it there if the artifact is missing or `source` has
+    changed since.
+
+    Returns:
+        Tuple[Dict[str, int], int, int]: Token counts, number of sentences and
+        number of words.
+    """
+    if is_vocab_of(vocab_file, source):
+        logger.info(f'Loading vocab from {vocab_file} ...')
+        return load_vocab(vocab_file)
+    if os.path.exists(vocab_file):
+        logger.info(f'{vocab_file} is not the vocab of {source}.')
+    logger.info(f'Counting vocab of {source} ...')
+    counts, corpus_count, total_words = count_vocab(source, workers)
+    save_vocab(vocab_file, counts, corpus_count, total_words, source)
+    logger.info(f'Saved vocab of {len(counts)} tokens to {vocab_file}')
+    return counts, corpus_count, total_words
+
+
+def get_model_path(opts):
+    name = f'{opts.name_prefix}_vs{opts.vector_size}w{opts.window}mc{opts.min_count}.model'
+    return os.path.join(settings.MODEL_FOLDER, name)
+
+
+def prepare_corpus(opts):
+    """Prepare the input for training according to `opts`.
+
+    Returns:
+        Tuple[Iterable[List[str]], str]: Iterable of sentences, or path to the
+        corpus file in corpus_file mode.
+    """
+    sentences = None
+    corpus_file = None
+    if opts.corpus_file_mode:
+        if opts.binary_corpus:
+            logger.warning('Ignore --binary_corpus in corpus_file mode.')
+        if opts.input_folder != '':
+            path = f'{opts.input_folder.rstrip(os.sep)}.txt'
+            logger.info(f'Concatenating {opts.input_folder} into {path} ...')
+            corpus_file = concat_text_files(opts.input_folder, path)
+        else:
+            corpus_file = opts.input_file
+    elif opts.binary_corpus:
+        source = opts.input_folder or opts.input_file
+        folder = f'{source.rstrip(os.sep)}.bin'
+        if not is_binary_corpus(folder, source):
+            logger.info(f'Converting {source} to binary corpus {folder} ...')
+            text_to_binary(source, folder)
+        sentences = BinarySentences(folder)
+    elif opts.input_folder != '':
+        sentences = PathLineSentences(opts.input_folder)
+    else:
+        sentences = LineSentence(opts.input_file)
+    return sentences, corpus_file
 
 
 @logger.catch(level=logging.WARNING)
@@ -49,35 +280,101 @@ def train(opts):
             'Both input file and input folder are set. '
             'Ignore input file: {opts.input_file}.'
         )
-    sentences = None
-    if opts.input_folder != '':
-        sentences = PathLineSentences(opts.input_folder)
-    else:
-        sentences = LineSentence(opts.input_file)
+    sentences, corpus_file = prepare_corpus(opts)
 
     # model path
-    name = f'{opts.name_prefix}_vs{opts.vector_size}w{opts.window}mc{opts.min_count}.model'
-    path = os.path.join(settings.MODEL_FOLDER, name)
+    path = get_model_path(opts)
+
+    checkpoint_path = f'{path}.ckpt'
+
+    checkpoint = latest_checkpoint(checkpoint_path)
+    if opts.resume and checkpoint is not None:
+        # resume from checkpoint
+        logger.info(f'Resuming from {checkpoint} ...')
+        model = Word2Vec.load(checkpoint)
+        model.workers = opts.workers
+        schedule = model.train_checkpoint
+        logger.info(f'{schedule["epoch"]} of {schedule["epochs"]} epochs finished.')
+    else:
+        # build vocab
+        model = Word2Vec(
+            size=opts.vector_size,
+            window=opts.window,
+            min_count=opts.min_count,
+            sample=opts.sample,
+            iter=opts.epochs,
+            workers=opts.workers,
+            compute_loss=True,
+        )
+        if opts.vocab_file != '':
+            source = opts.input_folder or opts.input_file
+            counts, corpus_count, total_words = get_vocab(source, opts.vocab_file)
+            model.build_vocab_from_freq(counts, corpus_count=corpus_count)
+            model.corpus_total_words = total_words
+        else:
+            model.build_vocab(sentences=sentences, corpus_file=corpus_file)
+        schedule = {
+            'epoch': 0, 'epochs': opts.epochs,
+            'alpha': model.alpha, 'min_alpha': model.min_alpha,
+        }
+
+    # the learning rate decays linearly over all epochs, so the remaining
+    # epochs continue from the learning rate where the checkpoint stopped
+    done, epochs = schedule['epoch'], schedule['epochs']
+    alpha, min_alpha = schedule['alpha'], schedule['min_alpha']
+    start_alpha = alpha - (alpha - min_alpha) * done / epochs
 
     # train model
-    model = Word2Vec(
+    mode = 'corpus_file' if corpus_file is not None else 'iterable'
+    logger.info(f'Training in {mode} mode with {opts.workers} workers.')
+    train_logger = TrainLogger(
+        checkpoint_path=checkpoint_path,
+        checkpoint_epochs=opts.checkpoint_epochs,
+        checkpoint_minutes=opts.checkpoint_minutes,
+        schedule=schedule,
+        test_words=opts.test_words,
+    )
+    start = time.perf_counter()
+    model.train(
         sentences=sentences,
-        size=opts.vector_size,
-        window=opts.window,
-        min_count=opts.min_count,
-        iter=opts.epochs,
-        workers=opts.workers,
+        corpus_file=corpus_file,
+        total_examples=model.corpus_count,
+        total_words=model.corpus_total_words,
+        epochs=epochs - done,
+        start_alpha=start_alpha,
+        end_alpha=min_alpha,
         compute_loss=True,
-        callbacks=[TrainLogger()],
+        callbacks=[train_logger],
     )
+    seconds = time.perf_counter() - start
+    model.alpha, model.epochs = alpha, epochs
 
     # save model
     logger.info('Saving model ...')
+    model.callbacks = ()
+    if hasattr(model, 'train_checkpoint'):
+        del model.train_checkpoint
     model.save(path)
     logger.info(f'Saved model to {path}')
+    if os.path.exists(checkpoint_path):
+        shutil.rmtree(checkpoint_path)
 
+    if opts.export:
+        suffix = 'vectors' if opts.export_dtype == 'float32' else opts.export_dtype
+        folder = f'{path}.{suffix}'
+        export_vectors(model.wv.vectors, model.wv.index2word, folder, opts.export_dtype)
+        logger.info(f'Exported word vectors to {folder}')
 
-def get_train_options():
+    words_per_sec = train_logger.words_per_sec
+    return {
+        'path': path,
+        'vocab_size': len(model.wv.vocab),
+        'seconds': seconds,
+        'words_per_sec': sum(words_per_sec) / max(len(words_per_sec), 1),
+    }
+
+
+def get_train_parser():
     parser = argparse.ArgumentParser(
         description="Train Chinese Word2Vec",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
@@ -94,6 +391,11 @@ def get_train_options():
         '--min_count', '-mc', type=int, default=5,
         help='Ignores all words with total frequency lower than this.'
     )
+    parser.add_argument(
+        '--sample', type=float, default=1e-3,
+        help='Threshold for downsampling frequent words on every epoch. '
+        'Use 0 for corpora subsampled at preprocessing time.'
+    )
     parser.add_argument(
         '--workers', type=int, default=4,
         help='Use these many worker threads to train the model.'
@@ -117,7 +419,53 @@ def get_train_options():
         help='Name prefix for the model. '
         'The actual name consist of the prefix and some other parameters of the model.'
     )
-    opts = parser.parse_args()
+    parser.add_argument(
+        '--binary_corpus', action='store_true',
+        help='Convert the input to a binary corpus of token ids next to it, '
+        'and train on it, so that epochs do not parse text again.'
+    )
+    parser.add_argument(
+        '--corpus_file_mode', action='store_true',
+        help='Train through the corpus_file code path of gensim, which scales '
+        'with workers. An input folder is concatenated into one file next to it.'
+    )
+    parser.add_argument(
+        '--vocab_file', type=str, default='',
+        help='Vocab artifact of the input. It is loaded if it was counted from '
+        'the input as it is, otherwise the vocab is counted in parallel and saved to it. '
+        'By default, the vocab is scanned by gensim in a single thread.'
+    )
+    parser.add_argument(
+        '--checkpoint_epochs', type=int, default=0,
+        help='Save a checkpoint every these many epochs. 0 to disable.'
+    )
+    parser.add_argument(
+        '--checkpoint_minutes', type=float, default=0,
+        help='Save a checkpoint at the end of an epoch if these many minutes '
+        'passed since the last one. 0 to disable.'
+    )
+    parser.add_argument(
+        '--test_words', type=str, nargs='+', default=None,
+        help='Words whose most similar words are logged at the end of each epoch.'
+    )
+    parser.add_argument(
+        '--export', action='store_true',
+        help='Export the word vectors as memory mappable arrays next to the model, '
+        'see utils/mapped.py.'
+    )
+    parser.add_argument(
+        '--export_dtype', type=str, default='float32', choices=DTYPES,
+        help='Storage type of the exported vectors, see utils/quantize.py.'
+    )
+    parser.add_argument(
+        '--resume', action='store_true',
+        help='Resume training from the checkpoint of the model if it exists.'
+    )
+    return parser
+
+
+def get_train_options(args=None):
+    opts = get_train_parser().parse_args(args)
     return opts
 
 
@@ -1,3 +1,4 @@
+import io
 import os
 import zipfile
 
@@ -7,3 +8,21 @@ def unzip(zip_path, dest=None):
         dest = os.path.dirname(zip_path)
     with zipfile.ZipFile(zip_path, 'r') as z:
         z.extractall(dest)
+
+
+def iter_zip_lines(zip_path, name, buffer_size=1 << 24):
+    """Iterate lines of the member `name` of a zip archive without extracting it.
+
+    The member is matched by its base name, so it can be in any folder of the
+    archive. Reads are buffered by `buffer_size` bytes.
+    """
+    with zipfile.ZipFile(zip_path, 'r') as z:
+        member = next(
+            (i for i in z.infolist() if os.path.basename(i.filename) == name),
+            None
+        )
+        if member is None:
+            raise FileNotFoundError(f'{name} not found in {zip_path}')
+        with z.open(member) as raw:
+            buffered = io.BufferedReader(raw, buffer_size=buffer_size)
+            yield from io.TextIOWrapper(buffered, encoding='utf-8')
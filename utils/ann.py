@@ -0,0 +1,206 @@
+"""Approximate nearest neighbour index of word vectors.
+
+`IVFIndex` is an inverted file index: unit vectors are clustered by
+spherical k-means, and a query only scores the vectors of the `n_probe`
+clusters whose centroids are the most similar to it. The vectors are stored
+sorted by cluster, so that every probed cluster is a contiguous slice.
+
+An index is a folder of `.npy` files and a word list, loaded with
+`mmap_mode='r'`.
+"""
+
+import os
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from .similarity import top_k, unit_vectors
+
+
+def kmeans(x: np.ndarray, k: int, iters: int = 10, seed: int = 0,
+           batch_size: int = 1 << 16) -> np.ndarray:
+    """Spherical k-means of unit vectors.
+
+    Args:
+        x (np.ndarray): Unit vectors of shape (n, d).
+        k (int): Number of clusters.
+        iters (int, optional): Number of iterations. Defaults to 10.
+        seed (int, optional): Random seed. Defaults to 0.
+        batch_size (int, optional): Number of vectors assigned at a time.
+
+    Returns:
+        np.ndarray: Unit centroids of shape (k, d).
+    """
+    rng = np.random.RandomState(seed)
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(iters):
+        labels = assign(x, centroids, batch_size)
+        counts = np.bincount(labels, minlength=k)
+        starts = np.cumsum(counts) - counts
+        empty = counts == 0
+        sums = np.zeros_like(centroids)
+        sums[~empty] = np.add.reduceat(
+            x[np.argsort(labels, kind='stable')], starts[~empty], axis=0)
+        # restart empty clusters from random vectors
+        sums[empty] = x[rng.choice(len(x), int(empty.sum()), replace=False)]
+        centroids = unit_vectors(sums)
+    return centroids
+
+
+def assign(x: np.ndarray, centroids: np.ndarray,
+           batch_size: int = 1 << 16) -> np.ndarray:
+    """Index of the most similar centroid of each vector.
+    """
+    labels = np.empty(len(x), dtype=np.int64)
+    for i in range(0, len(x), batch_size):
+        labels[i:i + batch_size] = np.argmax(x[i:i + batch_size] @ centroids.T, axis=1)
+    return labels
+
+
+class IVFIndex:
+    """Inverted file index of unit vectors.
+
+    Args:
+        centroids (np.ndarray): Unit centroids of shape (n_lists, d).
+        offsets (np.ndarray): Offsets of the `n_lists + 1` lists in `vectors`.
+        ids (np.ndarray): Original row of each vector in `vectors`.
+        vectors (np.ndarray): Unit vectors sorted by list.
+        words (List[str]): Words of the original rows.
+    """
+
+    def __init__(self, centroids, offsets, ids, vectors, words):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.ids = ids
+        self.vectors = vectors
+        self.words = words
+        self.word_ids = {w: i for i, w in enumerate(words)}
+        # position of each original row in `vectors`
+        self.positions = np.empty(len(ids), dtype=np.int64)
+        self.positions[np.asarray(ids)] = np.arange(len(ids))
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, words: List[str], n_lists: int = None,
+              iters: int = 10, sample_size: int = None, seed: int = 0):
+        """Build an index of word vectors.
+
+        Args:
+            vectors (np.ndarray): Word vectors of shape (V, d).
+            words (List[str]): Words of the rows.
+            n_lists (int, optional): Number of clusters. Defaults to
+                `4 * sqrt(V)`.
+            iters (int, optional): Iterations of k-means. Defaults to 10.
+            sample_size (int, optional): Number of vectors to train k-means on.
+                Defaults to `64 * n_lists`.
+            seed (int, optional): Random seed. Defaults to 0.
+        """
+        unit = unit_vectors(vectors)
+        n = len(unit)
+        n_lists = min(n_lists or int(4 * np.sqrt(n)), n)
+        sample_size = min(sample_size or 64 * n_lists, n)
+        rng = np.random.RandomState(seed)
+        sample = unit[rng.choice(n, sample_size, replace=False)]
+        centroids = kmeans(sample, n_lists, iters, seed)
+        labels = assign(unit, centroids)
+        ids = np.argsort(labels, kind='stable')
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(labels, minlength=n_lists))
+        return cls(centroids, offsets, ids, unit[ids], list(words))
+
+    @classmethod
+    def from_model(cls, model_path: str, **kwargs):
+        """Build an index of the word vectors of a saved Word2Vec model.
+        """
+        from gensim.models import Word2Vec
+        model = Word2Vec.load(model_path)
+        return cls.build(model.wv.vectors, model.wv.index2word, **kwargs)
+
+    def save(self, folder: str):
+        os.makedirs(folder, exist_ok=True)
+        for name in ['centroids', 'offsets', 'ids', 'vectors']:
+            np.save(os.path.join(folder, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(folder, 'words.txt'), 'w') as f:
+            for w in self.words:
+                f.write(w)
+                f.write('\n')
+
+    @classmethod
+    def load(cls, folder: str, mmap_mode: str = 'r'):
+        arrays = [
+            np.load(os.path.join(folder, f'{name}.npy'), mmap_mode=mmap_mode)
+            for name in ['centroids', 'offsets', 'ids', 'vectors']
+        ]
+        with open(os.path.join(folder, 'words.txt'), 'r') as f:
+            words = f.read().split('\n')[:-1]
+        return cls(*arrays, words)
+
+    def search(self, queries: np.ndarray, topn: int = 10, n_probe: int = 8,
+               exclude: Sequence[Sequence[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top-n rows by cosine similarity of a batch of queries.
+
+        Args:
+            queries (np.ndarray): Query vectors of shape (Q, d).
+            topn (int, optional): Number of results. Defaults to 10.
+            n_probe (int, optional): Number of lists to scan per query.
+                Defaults to 8.
+            exclude (Sequence[Sequence[int]], optional): Rows to exclude for
+                each query.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Rows and scores of shape (Q, topn),
+            rows are -1 if there are fewer candidates than `topn`.
+        """
+        queries = unit_vectors(np.atleast_2d(queries))
+        n_probe = min(n_probe, len(self.centroids))
+        probes, _ = top_k(queries @ self.centroids.T, n_probe)
+        rows = np.full((len(queries), topn), -1, dtype=np.int64)
+        scores = np.full((len(queries), topn), -np.inf, dtype=np.float32)
+        for q, lists in enumerate(probes):
+            positions = np.concatenate([
+                np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists
+            ])
+            candidate_scores = (self.vectors[positions] @ queries[q])[None, :]
+            candidates = np.asarray(self.ids)[positions]
+            skip = None
+            if exclude is not None:
+                skip = [np.flatnonzero(np.isin(candidates, exclude[q]))]
+            best, values = top_k(candidate_scores, topn, skip)
+            best, values = best[0], values[0]
+            n = len(best)
+            rows[q, :n] = candidates[best]
+            scores[q, :n] = values
+        rows[np.isinf(scores)] = -1
+        return rows, scores
+
+    def vector(self, word: str) -> np.ndarray:
+        return self.vectors[self.positions[self.word_ids[word]]]
+
+    def most_similar(self, positive: Sequence[str] = (), negative: Sequence[str] = (),
+                     topn: int = 10, n_probe: int = 8) -> List[Tuple[str, float]]:
+        """Approximate `KeyedVectors.most_similar`, including analogies such as
+        `positive=['国王', '女'], negative=['男']`.
+        """
+        return self.most_similar_batch([(positive, negative)], topn, n_probe)[0]
+
+    def most_similar_batch(self, queries: Sequence[Tuple[Sequence[str], Sequence[str]]],
+                           topn: int = 10, n_probe: int = 8) -> List[List[Tuple[str, float]]]:
+        """Batch of `most_similar` queries, each a pair `(positive, negative)`.
+
+        Raises:
+            KeyError: A word is not in the index.
+            ValueError: A query has neither positive nor negative words.
+        """
+        vectors = []
+        exclude = []
+        for positive, negative in queries:
+            if not positive and not negative:
+                raise ValueError('query needs at least one positive or negative word')
+            v = sum(self.vector(w) for w in positive) - \
+                sum(self.vector(w) for w in negative)
+            vectors.append(v)
+            exclude.append([self.word_ids[w] for w in list(positive) + list(negative)])
+        rows, scores = self.search(np.array(vectors), topn, n_probe, exclude)
+        return [
+            [(self.words[r], float(s)) for r, s in zip(row, score) if r >= 0]
+            for row, score in zip(rows.tolist(), scores.tolist())
+        ]
@@ -0,0 +1,225 @@
+"""Pre-tokenized binary corpus with integer token ids.
+
+A binary corpus is a folder with:
+
+- `vocab.txt`: one token per line, the id of a token is its line number.
+- `tokens.bin`: flat int32 array of the token ids of all sentences.
+- `offsets.bin`: int64 array of `n + 1` offsets of the `n` sentences in
+  `tokens.bin`.
+- `meta.json`: sizes and modification times of the source text files,
+  written last, so that an incomplete corpus is never used.
+
+`BinarySentences` reads it through `numpy.memmap`, so that training epochs
+do not decode and split text again.
+"""
+
+import json
+import os
+import shutil
+from array import array
+from typing import Iterable, Iterator, List
+
+import numpy as np
+
+# the same limit as gensim.models.word2vec.MAX_WORDS_IN_BATCH
+MAX_SENTENCE_LENGTH = 10000
+
+
+def text_files(path: str) -> List[str]:
+    """Text files of a corpus, which is a file or a folder of files, in the
+    same order as `PathLineSentences`.
+    """
+    if os.path.isfile(path):
+        return [path]
+    files = (os.path.join(path, name) for name in sorted(os.listdir(path)))
+    return [f for f in files if os.path.isfile(f)]
+
+
+def _source_meta(path: str) -> dict:
+    return {
+        'source': os.path.abspath(path),
+        'files': [
+            [os.path.basename(f), os.path.getsize(f), int(os.path.getmtime(f))]
+            for f in text_files(path)
+        ],
+    }
+
+
+def concat_text_files(source: str, path: str) -> str:
+    """Concatenate the text files of a corpus into a single file, e.g. for the
+    `corpus_file` argument of gensim models.
+
+    The concatenated file is reused as long as it is newer than all files of
+    the corpus.
+
+    Args:
+        source (str): Text file or folder of text files.
+        path (str): Path to the concatenated file.
+
+    Returns:
+        str: `source` if it is a single file, otherwise `path`.
+    """
+    if os.path.isfile(source):
+        return source
+    files = text_files(source)
+    if os.path.exists(path) and \
+            all(os.path.getmtime(f) <= os.path.getmtime(path) for f in files):
+        return path
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as out:
+        for f in files:
+            with open(f, 'rb') as src:
+                shutil.copyfileobj(src, out, 1 << 20)
+                # the last line of a file must not merge with the next file
+                if src.tell() > 0:
+                    src.seek(-1, os.SEEK_END)
+                    if src.read(1) != b'\n':
+                        out.write(b'\n')
+    os.replace(tmp_path, path)
+    return path
+
+
+class Write2Binary:
+    """Write articles into a binary corpus.
+
+    Tokens get ids in the order in which they are first seen, so that the
+    corpus is written in a single pass.
+
+    Args:
+        folder (str): Folder of the binary corpus.
+        buffer_size (int, optional): Number of token ids buffered in memory
+            before they are flushed to disk. Defaults to 1 << 22.
+    """
+
+    def __init__(self, folder: str, buffer_size: int = 1 << 22):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.buffer_size = buffer_size
+        self.vocab = {}
+        self.tokens = array('i')
+        self.offsets = array('q', [0])
+        self.n_tokens = 0
+        self.tokens_out = open(os.path.join(folder, 'tokens.bin'), 'wb')
+        self.offsets_out = open(os.path.join(folder, 'offsets.bin'), 'wb')
+
+    def process(self, article: Iterable[str]):
+        vocab = self.vocab
+        for w in article:
+            i = vocab.get(w)
+            if i is None:
+                i = vocab[w] = len(vocab)
+            self.tokens.append(i)
+        self.offsets.append(self.n_tokens + len(self.tokens))
+        if len(self.tokens) >= self.buffer_size:
+            self.flush()
+        return article
+
+    def __call__(self, article):
+        return self.process(article)
+
+    def flush(self):
+        self.n_tokens += len(self.tokens)
+        self.tokens.tofile(self.tokens_out)
+        self.offsets.tofile(self.offsets_out)
+        self.tokens = array('i')
+        self.offsets = array('q')
+
+    def close(self):
+        self.flush()
+        self.tokens_out.close()
+        self.offsets_out.close()
+        with open(os.path.join(self.folder, 'vocab.txt'), 'w') as f:
+            for w in self.vocab:
+                f.write(w)
+                f.write('\n')
+
+
+def is_binary_corpus(folder: str, source: str = None) -> bool:
+    """Whether `folder` is a complete binary corpus, converted from `source`
+    if it is given and has not changed since.
+    """
+    meta_path = os.path.join(folder, 'meta.json')
+    if not os.path.exists(meta_path):
+        return False
+    if source is None:
+        return True
+    with open(meta_path, 'r') as f:
+        return json.load(f) == _source_meta(source)
+
+
+def text_to_binary(source: str, folder: str):
+    """Convert a text corpus into a binary corpus.
+
+    Args:
+        source (str): Text file or folder of text files, where each line is a
+            sentence or an article with tokens separated by whitespace.
+        folder (str): Folder of the binary corpus.
+    """
+    tmp_folder = f'{folder}.tmp'
+    if os.path.exists(tmp_folder):
+        shutil.rmtree(tmp_folder)
+    writer = Write2Binary(tmp_folder)
+    for path in text_files(source):
+        with open(path, 'r') as f:
+            for line in f:
+                writer(line.split())
+    writer.close()
+    with open(os.path.join(tmp_folder, 'meta.json'), 'w') as f:
+        json.dump(_source_meta(source), f)
+    if os.path.exists(folder):
+        shutil.rmtree(folder)
+    os.replace(tmp_folder, folder)
+
+
+class BinarySentences:
+    """Iterate sentences of a binary corpus as lists of tokens.
+
+    Like `LineSentence`, sentences longer than `max_sentence_length` are split,
+    and empty sentences are skipped.
+
+    Args:
+        folder (str): Folder of the binary corpus.
+        max_sentence_length (int, optional): Maximum number of tokens of a
+            sentence. Defaults to 10000.
+        block_size (int, optional): Number of token ids converted to tokens at
+            a time. Defaults to 1 << 20.
+    """
+
+    def __init__(self, folder: str,
+                 max_sentence_length: int = MAX_SENTENCE_LENGTH,
+                 block_size: int = 1 << 20):
+        self.folder = folder
+        self.max_sentence_length = max_sentence_length
+        self.block_size = block_size
+        with open(os.path.join(folder, 'vocab.txt'), 'r') as f:
+            self.words = np.array(f.read().split('\n')[:-1], dtype=object)
+        self.tokens = self._memmap('tokens.bin', np.int32)
+        self.offsets = self._memmap('offsets.bin', np.int64)
+
+    def _memmap(self, name, dtype):
+        path = os.path.join(self.folder, name)
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r')
+
+    def __len__(self):
+        return max(len(self.offsets) - 1, 0)
+
+    def __iter__(self) -> Iterator[List[str]]:
+        offsets = self.offsets
+        n = len(self)
+        limit = self.max_sentence_length
+        first = 0
+        while first < n:
+            # convert a block of whole sentences at once
+            start = int(offsets[first])
+            last = int(np.searchsorted(offsets, start + self.block_size, 'right')) - 1
+            last = min(max(last, first + 1), n)
+            end = int(offsets[last])
+            block = self.words[self.tokens[start:end]].tolist()
+            bounds = (offsets[first:last + 1] - start).tolist()
+            for i, j in zip(bounds, bounds[1:]):
+                while i < j:
+                    yield block[i:min(i + limit, j)]
+                    i += limit
+            first = last
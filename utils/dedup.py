@@ -0,0 +1,138 @@
+"""Near-duplicate detection with MinHash signatures and LSH banding.
+
+The MinHash signature of an article is computed on the set of its shingles,
+the runs of `shingle_size` consecutive tokens. The fraction of equal values
+of two signatures estimates the Jaccard similarity of the shingle sets.
+
+`MinHashLSH` splits signatures into bands. Two articles are candidates if
+they share a band, and near-duplicates if their estimated similarity reaches
+the threshold. It holds at most `max_entries` signatures, evicting the
+oldest, so its memory is bounded.
+"""
+
+from typing import Sequence
+from zlib import crc32
+
+import numpy as np
+
+# signature of articles without shingles, which are never duplicates
+EMPTY = np.uint32(0xFFFFFFFF)
+
+
+class MinHash:
+    """MinHash signatures of token shingles.
+
+    Args:
+        num_perm (int, optional): Number of hash functions, i.e. length of the
+            signatures. Defaults to 64.
+        shingle_size (int, optional): Number of tokens per shingle. Articles
+            with fewer tokens have a single shingle. Defaults to 5.
+        seed (int, optional): Seed of the hash functions. Defaults to 1.
+    """
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        # multiply-shift hash functions: the high 32 bits of a * x + b mod 2^64
+        self.a = rng.randint(0, 1 << 63, size=(num_perm, 1), dtype=np.int64).astype(np.uint64)
+        self.a |= np.uint64(1)
+        self.b = rng.randint(0, 1 << 63, size=(num_perm, 1), dtype=np.int64).astype(np.uint64)
+        self.mix = rng.randint(1, 1 << 32, size=shingle_size, dtype=np.int64).astype(np.uint64)
+
+    def shingles(self, tokens: Sequence[str]) -> np.ndarray:
+        """Unique 32 bits hashes of the shingles of `tokens`."""
+        if not tokens:
+            return np.zeros(0, dtype=np.uint64)
+        hashes = np.fromiter((crc32(t.encode('utf-8')) for t in tokens),
+                             dtype=np.uint64, count=len(tokens))
+        k = min(self.shingle_size, len(hashes))
+        windows = np.lib.stride_tricks.sliding_window_view(hashes, k)
+        return np.unique((windows * self.mix[:k]).sum(axis=1) & 0xFFFFFFFF)
+
+    def signature(self, tokens: Sequence[str]) -> np.ndarray:
+        """Signature of shape (num_perm,) as uint32."""
+        shingles = self.shingles(tokens)
+        if len(shingles) == 0:
+            return np.full(self.num_perm, EMPTY, dtype=np.uint32)
+        values = (self.a * shingles + self.b) >> np.uint64(32)
+        # EMPTY is reserved
+        return np.minimum(values.min(axis=1), 0xFFFFFFFE).astype(np.uint32)
+
+
+class MinHashLSH:
+    """Bounded LSH index of MinHash signatures, to drop near-duplicates.
+
+    Each band bucket holds the set of ids of all indexed signatures with that
+    band, and the candidates of a signature are compared in one vectorized
+    operation. Memory is about `max_entries * (4 * num_perm + 150 * bands)`
+    bytes.
+
+    Args:
+        num_perm (int, optional): Length of the signatures. Defaults to 64.
+        bands (int, optional): Number of bands, which must divide `num_perm`.
+            Defaults to 8.
+        threshold (float, optional): Estimated Jaccard similarity from which
+            articles are near-duplicates. Defaults to 0.8.
+        max_entries (int, optional): Number of signatures kept. Defaults to 200000.
+
+    Raises:
+        ValueError: `bands` does not divide `num_perm`.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 8,
+                 threshold: float = 0.8, max_entries: int = 200000):
+        if num_perm % bands != 0:
+            raise ValueError(f'{bands} bands do not divide {num_perm} permutations.')
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = np.zeros((max_entries, num_perm), dtype=np.uint32)
+        self.keys = np.zeros((max_entries, bands), dtype=np.uint64)
+        self.ids = np.full(max_entries, -1, dtype=np.int64)
+        self.mix = np.random.RandomState(0).randint(
+            1, 1 << 62, size=self.rows, dtype=np.int64).astype(np.uint64) | np.uint64(1)
+        self.count = 0
+
+    def _band_keys(self, signature: np.ndarray) -> np.ndarray:
+        bands = signature.reshape(self.bands, self.rows).astype(np.uint64)
+        return (bands * self.mix).sum(axis=1)
+
+    def add(self, signature: np.ndarray) -> bool:
+        """Add a signature unless it is a near-duplicate of an indexed one.
+
+        Returns:
+            bool: Whether the signature is new, i.e. the article is kept.
+        """
+        if signature[0] == EMPTY:
+            return True
+        keys = self._band_keys(signature)
+        candidates = set()
+        for buckets, key in zip(self.buckets, keys.tolist()):
+            bucket = buckets.get(key)
+            if bucket:
+                candidates |= bucket
+        if candidates:
+            slots = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            slots %= self.max_entries
+            similarity = (self.signatures[slots] == signature).mean(axis=1)
+            if similarity.max() >= self.threshold:
+                return False
+
+        slot = self.count % self.max_entries
+        if self.ids[slot] >= 0:
+            old = int(self.ids[slot])
+            for buckets, key in zip(self.buckets, self.keys[slot].tolist()):
+                bucket = buckets[key]
+                bucket.discard(old)
+                if not bucket:
+                    del buckets[key]
+        self.ids[slot] = self.count
+        self.signatures[slot] = signature
+        self.keys[slot] = keys
+        for buckets, key in zip(self.buckets, keys.tolist()):
+            buckets.setdefault(key, set()).add(self.count)
+        self.count += 1
+        return True
@@ -0,0 +1,126 @@
+"""Intrinsic evaluation of word vectors on analogy and similarity datasets.
+
+Analogy files use the format of word2vec's `questions-words.txt`, as the
+Chinese analogy dataset CA8: `: category` lines followed by questions
+`a b c d`, meaning `a : b = c : d`.
+
+Similarity files have a pair of words and a human score per line, separated
+by whitespace, as wordsim-240 and wordsim-297. Lines starting with `#` are
+comments.
+
+Analogies are answered by 3CosAdd in batches, with one matrix product per
+batch instead of one `most_similar` call per question.
+"""
+
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+Question = Tuple[str, str, str, str]
+
+
+def load_analogies(path: str) -> Dict[str, List[Question]]:
+    """Questions of an analogy file, by category, in file order."""
+    categories = OrderedDict()
+    category = 'default'
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith(':'):
+                category = line[1:].strip()
+                continue
+            words = line.split()
+            if len(words) == 4:
+                categories.setdefault(category, []).append(tuple(words))
+    return categories
+
+
+def load_similarities(path: str) -> List[Tuple[str, str, float]]:
+    """Word pairs and their scores of a similarity file."""
+    pairs = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 3 or line.startswith('#'):
+                continue
+            try:
+                pairs.append((parts[0], parts[1], float(parts[2])))
+            except ValueError:
+                continue  # header line
+    return pairs
+
+
+def rankdata(x: np.ndarray) -> np.ndarray:
+    """Ranks starting from 1, ties getting the average of their ranks."""
+    x = np.asarray(x)
+    ranks = np.empty(len(x), dtype=np.float64)
+    ranks[np.argsort(x, kind='mergesort')] = np.arange(1, len(x) + 1)
+    _, inverse, counts = np.unique(x, return_inverse=True, return_counts=True)
+    return (np.bincount(inverse, weights=ranks) / counts)[inverse]
+
+
+def spearman(x: Sequence[float], y: Sequence[float]) -> float:
+    """Spearman rank correlation of `x` and `y`."""
+    if len(x) < 2:
+        return float('nan')
+    rx, ry = rankdata(x), rankdata(y)
+    rx, ry = rx - rx.mean(), ry - ry.mean()
+    denominator = np.sqrt((rx ** 2).sum() * (ry ** 2).sum())
+    return float((rx * ry).sum() / denominator) if denominator > 0 else float('nan')
+
+
+def evaluate_analogies(unit: np.ndarray, index: Dict[str, int],
+                       questions: Sequence[Question],
+                       batch_size: int = 128) -> Dict:
+    """Accuracy of 3CosAdd on analogy questions.
+
+    Args:
+        unit (np.ndarray): Unit word vectors of shape (V, d).
+        index (Dict[str, int]): Row of each word of `unit`.
+        questions (Sequence[Question]): Questions `(a, b, c, d)`.
+        batch_size (int, optional): Number of questions per matrix product.
+            Defaults to 128.
+
+    Returns:
+        Dict: `correct` answers among the `count` questions whose words are
+            all in `index`, `skipped` questions, and `accuracy`.
+    """
+    ids = np.array([
+        [index[w] for w in q] for q in questions if all(w in index for w in q)
+    ], dtype=np.int64).reshape(-1, 4)
+    correct = 0
+    for i in range(0, len(ids), batch_size):
+        batch = ids[i:i + batch_size]
+        queries = unit[batch[:, 1]] - unit[batch[:, 0]] + unit[batch[:, 2]]
+        scores = queries @ unit.T
+        scores[np.arange(len(batch))[:, None], batch[:, :3]] = -np.inf
+        correct += int((scores.argmax(axis=1) == batch[:, 3]).sum())
+    return {
+        'correct': correct,
+        'count': len(ids),
+        'skipped': len(questions) - len(ids),
+        'accuracy': correct / len(ids) if len(ids) else float('nan'),
+    }
+
+
+def evaluate_similarities(unit: np.ndarray, index: Dict[str, int],
+                          pairs: Sequence[Tuple[str, str, float]]) -> Dict:
+    """Spearman correlation of cosine similarities and human scores.
+
+    Returns:
+        Dict: `spearman` over the `count` pairs whose words are in `index`,
+            and `skipped` pairs.
+    """
+    found = [(index[a], index[b], s) for a, b, s in pairs if a in index and b in index]
+    if not found:
+        return {'spearman': float('nan'), 'count': 0, 'skipped': len(pairs)}
+    a, b, human = (np.array(column) for column in zip(*found))
+    cosines = (unit[a] * unit[b]).sum(axis=1)
+    return {
+        'spearman': spearman(cosines, human),
+        'count': len(found),
+        'skipped': len(pairs) - len(found),
+    }
@@ -0,0 +1,146 @@
+"""Sharded output of incremental processing, indexed by content hash.
+
+An incremental output folder has:
+
+- `part-{k:05d}.txt`: processed articles, one per line. Each run that finds
+  new or changed articles appends one shard.
+- `part-{k:05d}.hashes.npy`: uint64 content hashes of the input articles of
+  the lines of the shard, in the same order.
+- `manifest.json`: the committed shards and the pipelines that produced them.
+
+The hashes of all shards form the index: an input article whose hash is in
+the index was processed by a previous run and is reused as it is.
+"""
+
+import json
+import os
+import shutil
+from hashlib import blake2b
+from typing import Iterable
+
+import numpy as np
+
+
+def content_hash(article: Iterable[str]) -> int:
+    """64 bits hash of the text of an article."""
+    text = '\n'.join(article).encode('utf-8')
+    return int.from_bytes(blake2b(text, digest_size=8).digest(), 'little')
+
+
+class ShardIndex:
+    """Shards of an incremental output folder and their content hashes.
+
+    Args:
+        folder (str): Folder of the shards.
+        pipelines (str): Description of the pipelines, e.g. their repr.
+
+    Raises:
+        ValueError: The shards of `folder` were produced by other pipelines.
+    """
+
+    def __init__(self, folder: str, pipelines: str):
+        self.folder = folder
+        self.manifest_path = os.path.join(folder, 'manifest.json')
+        os.makedirs(folder, exist_ok=True)
+        self.manifest = {'pipelines': pipelines, 'shards': []}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r') as f:
+                self.manifest = json.load(f)
+        if self.manifest['pipelines'] != pipelines:
+            raise ValueError(
+                f'{folder} was processed by {self.manifest["pipelines"]}, '
+                f'not {pipelines}. Delete it to process everything again.'
+            )
+        hashes = [self.load_hashes(k) for k in self.shards()]
+        self.hashes = np.sort(np.concatenate(hashes)) if hashes else \
+            np.zeros(0, dtype=np.uint64)
+
+    def shards(self) -> list:
+        return list(self.manifest['shards'])
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __contains__(self, h: int) -> bool:
+        i = np.searchsorted(self.hashes, np.uint64(h))
+        return i < len(self.hashes) and self.hashes[i] == h
+
+    def path(self, shard: int) -> str:
+        return os.path.join(self.folder, f'part-{shard:05d}.txt')
+
+    def hashes_path(self, shard: int) -> str:
+        return os.path.join(self.folder, f'part-{shard:05d}.hashes.npy')
+
+    def load_hashes(self, shard: int) -> np.ndarray:
+        return np.load(self.hashes_path(shard))
+
+    def next_shard(self) -> int:
+        return max(self.shards(), default=-1) + 1
+
+    def _save_manifest(self):
+        tmp_path = f'{self.manifest_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def add(self, shard: int, tmp_path: str, hashes: np.ndarray):
+        """Commit the shard written to `tmp_path`, whose lines have `hashes`.
+        """
+        np.save(self.hashes_path(shard), hashes.astype(np.uint64))
+        os.replace(tmp_path, self.path(shard))
+        self.manifest['shards'].append(shard)
+        self._save_manifest()
+        self.hashes = np.sort(np.concatenate([self.hashes, hashes]))
+
+    def compact(self, seen: np.ndarray) -> int:
+        """Remove the lines whose hashes are not in `seen`, i.e. articles that
+        were changed or removed from the input.
+
+        Returns:
+            int: Number of removed lines.
+
+        Raises:
+            RuntimeError: A shard and its hashes have different lengths.
+        """
+        removed = 0
+        for shard in self.shards():
+            hashes = self.load_hashes(shard)
+            keep = np.isin(hashes, seen)
+            if keep.all():
+                continue
+            removed += int((~keep).sum())
+            if not keep.any():
+                self.manifest['shards'].remove(shard)
+                self._save_manifest()
+                os.remove(self.path(shard))
+                os.remove(self.hashes_path(shard))
+                continue
+            tmp_path = f'{self.path(shard)}.tmp'
+            lines = 0
+            with open(self.path(shard), 'rb') as f, open(tmp_path, 'wb') as out:
+                for line in f:
+                    if lines < len(keep) and keep[lines]:
+                        out.write(line)
+                    lines += 1
+            if lines != len(hashes):
+                os.remove(tmp_path)
+                raise RuntimeError(
+                    f'{self.path(shard)} has {lines} lines, but {len(hashes)} hashes.')
+            # a crash between the two renames leaves more hashes than lines,
+            # which is detected above by the next run
+            hashes_tmp_path = f'{self.hashes_path(shard)}.tmp'
+            with open(hashes_tmp_path, 'wb') as f:
+                np.save(f, hashes[keep])
+            os.replace(tmp_path, self.path(shard))
+            os.replace(hashes_tmp_path, self.hashes_path(shard))
+        self.hashes = self.hashes[np.isin(self.hashes, seen)]
+        return removed
+
+    def merge(self, output_path: str):
+        """Concatenate the shards into `output_path`."""
+        tmp_path = f'{output_path}.tmp'
+        with open(tmp_path, 'wb') as out:
+            for shard in self.shards():
+                with open(self.path(shard), 'rb') as f:
+                    shutil.copyfileobj(f, out, 1 << 20)
+        os.replace(tmp_path, output_path)
@@ -1,7 +1,13 @@
+import atexit
+import json
 import logging
-from functools import wraps
+import multiprocessing
+import os
 import sys
+import time
 import traceback
+from functools import wraps
+from logging.handlers import QueueHandler, QueueListener
 
 
 class BaseLogger:
@@ -12,12 +18,21 @@ class BaseLogger:
     decorator method BaseLogger.catch to catch exceptions of functions and
     log them.
 
+    In queue mode, see BaseLogger.start_queue, records of all processes are
+    sent to a single listener thread, which owns the handlers, so that
+    logging does not block on I/O and lines of processes do not interleave.
+
+    Progress messages of hot loops are rate limited by BaseLogger.progress,
+    and metrics are logged as JSON by BaseLogger.metrics.
+
     Attributes:
         datefmt (str): date format of logging
         fmt (str): message format of logging
         level (int): logging level
         logger (logging.Logger): logger
         name (str): name of the logger
+        progress_interval (float): minimum seconds between progress messages
+        of the same key
     """
 
     def __init__(self,
@@ -25,16 +40,24 @@ class BaseLogger:
                  fmt='[%(asctime)s][%(levelname)s] %(message)s',
                  datefmt='%Y-%m-%d %H:%M:%S',
                  level=logging.DEBUG,
+                 progress_interval=10,
                  **kwargs):
 
         self.name = name
         self.fmt = fmt
         self.datefmt = datefmt
         self.level = level
+        self.progress_interval = progress_interval
 
         self.logger = logging.getLogger(name=name)
         self.logger.setLevel(level)
 
+        self._queue = None
+        self._listener = None
+        self._listener_pid = None
+        self._queued_handlers = []
+        self.progress_times = {}
+
     def catch(self, func=None, level=logging.DEBUG, trace=False):
         """A decorator to catch exceptions from functions and log them
 
@@ -83,12 +106,124 @@ class BaseLogger:
         handler.setFormatter(self.formatter)
         self.logger.addHandler(handler)
 
+    def log_metrics_to(self, filename):
+        """Write metrics records, see BaseLogger.metrics, to a file as JSON lines.
+        """
+        for handler in self.logger.handlers:
+            if isinstance(handler, logging.FileHandler) and handler.baseFilename == filename:
+                return
+        handler = logging.FileHandler(filename)
+        handler.addFilter(lambda record: hasattr(record, 'metrics'))
+        handler.setFormatter(MetricsFormatter())
+        self.logger.addHandler(handler)
+
+    def start_queue(self, queue=None):
+        """Send records through a queue to a listener thread, which takes
+        over the handlers added so far.
+
+        Processes forked afterwards, e.g. by multiprocessing on Linux, inherit
+        the queue handler, so their records are written by the listener of
+        this process. The listener is stopped, and its queue flushed, at exit.
+
+        Args:
+            queue (multiprocessing.Queue, optional): queue of records, to share
+            with processes that are not forked. Default to a new queue.
+
+        Returns:
+            multiprocessing.Queue: queue of records
+        """
+        if self._listener is not None:
+            return self._queue
+        self._queue = queue if queue is not None else multiprocessing.Queue()
+        self._queued_handlers = list(self.logger.handlers)
+        for handler in self._queued_handlers:
+            self.logger.removeHandler(handler)
+        self.logger.addHandler(QueueHandler(self._queue))
+        self._listener = QueueListener(
+            self._queue, *self._queued_handlers, respect_handler_level=True)
+        self._listener.start()
+        self._listener_pid = os.getpid()
+        atexit.register(self.stop_queue)
+        return self._queue
+
+    def log_to_queue(self, queue):
+        """Send records to the queue of a listener in another process, e.g. in
+        processes started with spawn.
+        """
+        self._queue = queue
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+        self.logger.addHandler(QueueHandler(queue))
+
+    def stop_queue(self):
+        """Write the records left in the queue, stop the listener and log
+        directly through its handlers again.
+        """
+        if self._listener is None or os.getpid() != self._listener_pid:
+            return
+        self._listener.stop()
+        for handler in list(self.logger.handlers):
+            if isinstance(handler, QueueHandler):
+                self.logger.removeHandler(handler)
+        for handler in self._queued_handlers:
+            self.logger.addHandler(handler)
+        self._listener = None
+
+    def progress(self, msg, key='', interval=None):
+        """Log a progress message at INFO level, unless one with the same key
+        was logged by this process in the last `interval` seconds.
+
+        Args:
+            msg (str): message
+            key (str, optional): key of the progress, e.g. a path
+            interval (float, optional): minimum seconds between messages.
+            Default to self.progress_interval.
+
+        Returns:
+            bool: whether the message is logged
+        """
+        now = time.monotonic()
+        interval = self.progress_interval if interval is None else interval
+        last = self.progress_times.get(key)
+        if last is not None and now - last < interval:
+            return False
+        self.progress_times[key] = now
+        self.logger.info(msg)
+        return True
+
+    def metrics(self, name, values, level=logging.INFO):
+        """Log metrics as a JSON message, which handlers added by
+        BaseLogger.log_metrics_to write as a JSON line with its time and
+        process.
+
+        Args:
+            name (str): name of the metrics, e.g. 'epoch'
+            values (dict): JSON serializable metrics
+            level (int, optional): logging level
+        """
+        metrics = {'name': name, **values}
+        self.logger.log(level, f'[metrics] {json.dumps(metrics)}',
+                        extra={'metrics': metrics})
+
     def __getattr__(self, key):
         """Redirect missing attributes to self.logger
         """
         return getattr(self.logger, key)
 
 
+class MetricsFormatter(logging.Formatter):
+
+    """Format metrics records as JSON lines.
+    """
+
+    def format(self, record):
+        return json.dumps({
+            'time': record.created,
+            'process': record.process,
+            **record.metrics,
+        })
+
+
 class FileLogger(BaseLogger):
 
     """Simple class that logs messages to a file.
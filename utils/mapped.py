@@ -0,0 +1,218 @@
+"""Word vectors exported as raw arrays, loaded with memory mapping.
+
+An export is a folder with:
+
+- `meta.json`: the storage type of the vectors.
+- `vectors.npy`: float32 vectors of shape (V, d), or the arrays of a codec
+  of unit vectors for compressed types, see `utils/quantize.py`.
+- `norms.npy`: float32 L2 norms of the vectors.
+- `words.npy` and `offsets.npy`: the words encoded in UTF-8 and concatenated
+  in row order, with the `V + 1` offsets of the words.
+- `order.npy`: int32 rows sorted by word, for binary search.
+
+`MappedVectors.load` maps all arrays with `mmap_mode='r'`, so that startup
+takes milliseconds and processes loading the same export share pages.
+"""
+
+import json
+import os
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from .quantize import BLOCK_SIZE, CODECS
+from .similarity import top_k, unit_vectors
+
+VOCAB_ARRAYS = ['norms', 'words', 'offsets', 'order']
+DTYPES = ['float32'] + list(CODECS)
+
+
+def vector_arrays(vectors: np.ndarray, words: Sequence[str],
+                  dtype: str = 'float32', **codec_kwargs) -> dict:
+    """Arrays of an export of word vectors, by name.
+
+    Args:
+        vectors (np.ndarray): Word vectors of shape (V, d).
+        words (Sequence[str]): Words of the rows.
+        dtype (str, optional): One of `DTYPES`. Defaults to 'float32'.
+        codec_kwargs: Arguments of the codec, e.g. `subspaces` for 'pq'.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    encoded = [w.encode('utf-8') for w in words]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(w) for w in encoded])
+    arrays = {
+        'norms': np.linalg.norm(vectors, axis=1).astype(np.float32),
+        'words': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+        'offsets': offsets,
+        'order': np.array(sorted(range(len(encoded)), key=encoded.__getitem__),
+                          dtype=np.int32),
+    }
+    if dtype == 'float32':
+        arrays['vectors'] = vectors
+    else:
+        codec = CODECS[dtype](**codec_kwargs)
+        arrays.update(codec.encode(unit_vectors(vectors, arrays['norms'])))
+    return arrays
+
+
+def export_vectors(vectors: np.ndarray, words: Sequence[str], folder: str,
+                   dtype: str = 'float32', **codec_kwargs):
+    """Export word vectors to `folder`, see `vector_arrays` for the arguments.
+    """
+    os.makedirs(folder, exist_ok=True)
+    arrays = vector_arrays(vectors, words, dtype, **codec_kwargs)
+    for name, array in arrays.items():
+        np.save(os.path.join(folder, f'{name}.npy'), array)
+    meta = {'dtype': dtype, 'arrays': sorted(arrays)}
+    with open(os.path.join(folder, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+
+def export_model(model_path: str, folder: str = None,
+                 dtype: str = 'float32', **codec_kwargs) -> str:
+    """Export the word vectors of a saved Word2Vec model, by default to
+    `{model_path}.vectors`, or `{model_path}.{dtype}` for compressed types.
+
+    Returns:
+        str: Folder of the export.
+    """
+    from gensim.models import Word2Vec
+    if folder is None:
+        suffix = 'vectors' if dtype == 'float32' else dtype
+        folder = f'{model_path}.{suffix}'
+    model = Word2Vec.load(model_path)
+    export_vectors(model.wv.vectors, model.wv.index2word, folder,
+                   dtype, **codec_kwargs)
+    return folder
+
+
+class MappedVectors:
+    """Word vectors of an export, memory mapped.
+
+    Args:
+        arrays (dict): Arrays of the export, by name.
+        dtype (str, optional): Storage type of the vectors. Defaults to 'float32'.
+    """
+
+    def __init__(self, arrays: dict, dtype: str = 'float32'):
+        self.arrays = arrays
+        self.dtype = dtype
+        self.codec = None if dtype == 'float32' else CODECS[dtype]()
+        self.vectors = arrays.get('vectors')
+        self.norms = arrays['norms']
+        self.words = arrays['words']
+        self.offsets = arrays['offsets']
+        self.order = arrays['order']
+
+    @classmethod
+    def load(cls, folder: str, mmap_mode: str = 'r'):
+        meta_path = os.path.join(folder, 'meta.json')
+        meta = {'dtype': 'float32', 'arrays': ['vectors'] + VOCAB_ARRAYS}
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(folder, f'{name}.npy'), mmap_mode=mmap_mode)
+            for name in meta['arrays']
+        }
+        return cls(arrays, meta['dtype'])
+
+    @classmethod
+    def from_model(cls, model_path: str, dtype: str = 'float32', **codec_kwargs):
+        """Word vectors of a saved Word2Vec model, held in memory."""
+        from gensim.models import Word2Vec
+        wv = Word2Vec.load(model_path).wv
+        return cls(vector_arrays(wv.vectors, wv.index2word, dtype, **codec_kwargs), dtype)
+
+    def nbytes(self) -> int:
+        """Total size of the arrays."""
+        return sum(a.nbytes for a in self.arrays.values())
+
+    def __len__(self):
+        return len(self.norms)
+
+    def __contains__(self, word):
+        return self.index(word) >= 0
+
+    def _word_bytes(self, row: int) -> bytes:
+        return self.words[self.offsets[row]:self.offsets[row + 1]].tobytes()
+
+    def word(self, row: int) -> str:
+        return self._word_bytes(row).decode('utf-8')
+
+    def index(self, word: str) -> int:
+        """Row of `word` by binary search, or -1 if it is not in the vocab.
+        """
+        key = word.encode('utf-8')
+        lo, hi = 0, len(self.order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._word_bytes(self.order[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.order) and self._word_bytes(self.order[lo]) == key:
+            return int(self.order[lo])
+        return -1
+
+    def _row(self, word: str) -> int:
+        row = self.index(word)
+        if row < 0:
+            raise KeyError(f"word '{word}' not in vocabulary")
+        return row
+
+    def unit_rows(self, rows: Sequence[int]) -> np.ndarray:
+        """Unit vectors of `rows`, approximated for compressed types."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if self.codec is None:
+            norms = np.where(self.norms[rows] > 0, self.norms[rows], 1)
+            return self.vectors[rows] / norms[:, None]
+        return self.codec.decode(self.arrays, rows)
+
+    def vector(self, word: str) -> np.ndarray:
+        row = self._row(word)
+        if self.codec is None:
+            return self.vectors[row]
+        return self.unit_rows([row])[0] * self.norms[row]
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """Cosine scores of shape (Q, V) of a batch of unit queries, computed
+        directly against the stored form of the vectors.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        if self.codec is not None:
+            return self.codec.scores(self.arrays, queries)
+        norms = np.where(self.norms > 0, self.norms, 1)
+        scores = np.empty((len(queries), len(self)), dtype=np.float32)
+        for i in range(0, len(self), BLOCK_SIZE):
+            block = self.vectors[i:i + BLOCK_SIZE]
+            scores[:, i:i + BLOCK_SIZE] = (queries @ block.T) / norms[i:i + BLOCK_SIZE]
+        return scores
+
+    def most_similar(self, positive: Sequence[str] = (), negative: Sequence[str] = (),
+                     topn: int = 10) -> List[Tuple[str, float]]:
+        """Same as `KeyedVectors.most_similar` with words."""
+        return self.most_similar_batch([(positive, negative)], topn)[0]
+
+    def most_similar_batch(self, queries: Sequence[Tuple[Sequence[str], Sequence[str]]],
+                           topn: int = 10) -> List[List[Tuple[str, float]]]:
+        """Batch of `most_similar` queries, each a pair `(positive, negative)`,
+        answered with one scoring pass.
+
+        Raises:
+            KeyError: A word is not in the vocab.
+        """
+        vectors = []
+        exclude = []
+        for positive, negative in queries:
+            pos = [self._row(w) for w in positive]
+            neg = [self._row(w) for w in negative]
+            units = self.unit_rows(pos + neg)
+            vectors.append(units[:len(pos)].sum(axis=0) - units[len(pos):].sum(axis=0))
+            exclude.append(pos + neg)
+        rows, values = top_k(self.scores(unit_vectors(np.array(vectors))), topn, exclude)
+        return [
+            [(self.word(r), float(v)) for r, v in zip(row, value)]
+            for row, value in zip(rows.tolist(), values.tolist())
+        ]
@@ -0,0 +1,207 @@
+"""Detect phrases, i.e. frequent collocations such as named entities split
+by jieba, in parallel, and rewrite a corpus with them.
+
+Unigrams and bigrams are counted in line-aligned byte ranges of the corpus
+in a process pool, as `utils/vocab.py`. Count tables are bounded as in
+gensim's `Phrases`: when a table has more than its maximum number of entries,
+the entries counted less than `min_reduce` times are dropped and
+`min_reduce` grows by one.
+
+A bigram `a b` becomes a phrase if its score, the one of gensim's `Phrases`
+from Mikolov et al.,
+
+    (count(a b) - min_count) / (count(a) * count(b)) * table size
+
+is above `threshold`. Phrases are saved as a tab separated file of lines
+`a\\tb\\tscore`, and applied by rewriting the ranges of the corpus in
+parallel, each into its own shard.
+"""
+
+import os
+from collections import Counter
+from multiprocessing import Pool, cpu_count
+from typing import Dict, List, Tuple
+
+from .corpus import text_files
+from .shard import iter_lines, line_ranges
+
+Phrases = Dict[Tuple[str, str], float]
+
+
+def _prune(counts: Counter, max_size: int, min_reduce: int) -> int:
+    """Drop rare entries of `counts` until it has at most `max_size` entries.
+
+    Returns:
+        int: `min_reduce` for the next pruning.
+    """
+    while len(counts) > max_size:
+        for key in [key for key, c in counts.items() if c < min_reduce]:
+            del counts[key]
+        min_reduce += 1
+    return min_reduce
+
+
+def _count_range(args) -> Counter:
+    """Count unigrams and bigrams, keyed `a b`, in a byte range of a file.
+    """
+    path, start, end, max_size = args
+    counts = Counter()
+    min_reduce = 1
+    for line in iter_lines(path, start, end):
+        tokens = line.decode('utf-8').split()
+        counts.update(tokens)
+        counts.update(' '.join(pair) for pair in zip(tokens, tokens[1:]))
+        if len(counts) > max_size:
+            min_reduce = _prune(counts, max_size, min_reduce)
+    return counts
+
+
+def count_ngrams(source: str, workers: int = None,
+                 max_size: int = 10000000) -> Counter:
+    """Count the unigrams and bigrams of a text corpus across processes.
+
+    Args:
+        source (str): Text file or folder of text files.
+        workers (int, optional): Number of processes. Defaults to the number
+            of cpus.
+        max_size (int, optional): Maximum number of entries of the merged
+            count table, about 150 bytes each. Each process keeps at most
+            `max_size / workers` entries. Defaults to 10000000.
+
+    Returns:
+        Counter: Counts of unigrams `a` and bigrams `a b`.
+    """
+    workers = workers or cpu_count()
+    worker_size = max(max_size // workers, 1)
+    tasks = [
+        (path, start, end, worker_size)
+        for path in text_files(source)
+        for start, end in line_ranges(path, 4 * workers)
+    ]
+    counts = Counter()
+    min_reduce = 1
+    with Pool(workers) as pool:
+        for c in pool.imap_unordered(_count_range, tasks):
+            counts.update(c)
+            if len(counts) > max_size:
+                min_reduce = _prune(counts, max_size, min_reduce)
+    return counts
+
+
+def find_phrases(counts: Counter, min_count: int = 5,
+                 threshold: float = 10.0) -> Phrases:
+    """Bigrams of `counts` whose score is above `threshold`.
+
+    Returns:
+        Phrases: Score of each phrase `(a, b)`.
+    """
+    size = len(counts)
+    phrases = {}
+    for key, count in counts.items():
+        if count < min_count or ' ' not in key:
+            continue
+        a, b = key.split(' ')
+        if a not in counts or b not in counts:
+            continue  # pruned
+        score = (count - min_count) / (counts[a] * counts[b]) * size
+        if score > threshold:
+            phrases[(a, b)] = score
+    return phrases
+
+
+def save_phrases(path: str, phrases: Phrases):
+    with open(path, 'w') as f:
+        for (a, b), score in sorted(phrases.items(), key=lambda x: -x[1]):
+            f.write(f'{a}\t{b}\t{score:.4f}\n')
+
+
+def load_phrases(path: str) -> Phrases:
+    phrases = {}
+    with open(path, 'r') as f:
+        for line in f:
+            a, b, score = line.rstrip('\n').split('\t')
+            phrases[(a, b)] = float(score)
+    return phrases
+
+
+def apply_phrases(tokens: List[str], phrases: Phrases, delimiter: str = '_') -> List[str]:
+    """Join the phrases of `tokens`, greedily from left to right."""
+    result = []
+    i = 0
+    n = len(tokens)
+    while i < n:
+        if i + 1 < n and (tokens[i], tokens[i + 1]) in phrases:
+            result.append(f'{tokens[i]}{delimiter}{tokens[i + 1]}')
+            i += 2
+        else:
+            result.append(tokens[i])
+            i += 1
+    return result
+
+
+_phrases = None
+_delimiter = '_'
+
+
+def _init_rewrite(phrases: Phrases, delimiter: str):
+    global _phrases, _delimiter
+    _phrases, _delimiter = phrases, delimiter
+
+
+def _rewrite_range(args) -> int:
+    """Rewrite a byte range of a file into a shard with joined phrases.
+
+    Returns:
+        int: Number of phrases joined.
+    """
+    path, start, end, shard_path = args
+    joined = 0
+    tmp_path = f'{shard_path}.tmp'
+    with open(tmp_path, 'w') as out:
+        for line in iter_lines(path, start, end):
+            tokens = line.decode('utf-8').split()
+            rewritten = apply_phrases(tokens, _phrases, _delimiter)
+            joined += len(tokens) - len(rewritten)
+            out.write(' '.join(rewritten))
+            out.write('\n')
+    os.replace(tmp_path, shard_path)
+    return joined
+
+
+def rewrite_corpus(source: str, folder: str, phrases: Phrases,
+                   workers: int = None, delimiter: str = '_') -> int:
+    """Rewrite a text corpus with joined phrases into shards in `folder`, in
+    the order of the corpus, so that the folder can be trained on with
+    `--input_folder`.
+
+    Args:
+        source (str): Text file or folder of text files.
+        folder (str): Output folder of the shards.
+        phrases (Phrases): Phrases to join.
+        workers (int, optional): Number of processes. Defaults to the number
+            of cpus.
+        delimiter (str, optional): Delimiter of the tokens of a phrase, which
+            must not appear in tokens, so that different phrases are joined
+            differently, e.g. `中国_人民` and `中_国人民`. Defaults to '_', as
+            gensim's `Phrases`.
+
+    Returns:
+        int: Number of phrases joined.
+    """
+    workers = workers or cpu_count()
+    os.makedirs(folder, exist_ok=True)
+    for name in os.listdir(folder):
+        if name.startswith('part-'):
+            os.remove(os.path.join(folder, name))  # shards of a previous rewrite
+    ranges = [
+        (path, start, end)
+        for path in text_files(source)
+        for start, end in line_ranges(path, 4 * workers)
+    ]
+    tasks = [
+        (path, start, end, os.path.join(folder, f'part-{i:05d}.txt'))
+        for i, (path, start, end) in enumerate(ranges)
+    ]
+    with Pool(workers, initializer=_init_rewrite,
+              initargs=(phrases, delimiter)) as pool:
+        return sum(pool.imap_unordered(_rewrite_range, tasks))
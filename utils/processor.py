@@ -1,13 +1,29 @@
 import json
 import os
-from multiprocessing import Process, Queue, Value
-from typing import Iterable, List
+import random
+import re
+import shutil
+import time
+from array import array
+from functools import lru_cache
+from itertools import groupby
+from multiprocessing import BoundedSemaphore, Process, Queue, Value
+from queue import Empty
+from typing import Callable, Dict, Iterable, Iterator, List, Union
 
 import jieba
+import numpy as np
 import settings
 from opencc import OpenCC
 
+from .dedup import MinHash, MinHashLSH
 from .download import download
+from .incremental import ShardIndex, content_hash
+from .shard import iter_lines, line_ranges
+from .vocab import count_vocab, is_vocab_of, load_vocab, save_vocab
+
+# tokens consisting of Chinese characters strictly between U+4E00 and U+9FFF
+CHINESE_WORD = re.compile('[\u4e01-\u9ffe]*')
 
 
 class Pipeline:
@@ -41,25 +57,110 @@ class Pipeline:
         return self.__class__.__name__
 
 
-class ConvertT2S(Pipeline):
-    """Convert traditional Chinese to simplified Chinese using OpenCC.
+class CachedPipeline(Pipeline):
+    """Base class of pipelines with an optional LRU cache of their per-item
+    function `self.compute`.
+
+    The cache is created lazily, so that each worker process gets its own.
+
+    Args:
+        cache_size (int, optional): Maximum number of cached items. Use 0 to
+        disable the cache. Defaults to 0.
     """
 
-    def __init__(self):
+    def __init__(self, cache_size: int = 0):
         super().__init__()
+        self.cache_size = cache_size
+        self._cached = None
+
+    def compute(self, item):
+        raise NotImplementedError()
+
+    def cached(self, item):
+        if self._cached is None:
+            self._cached = lru_cache(maxsize=self.cache_size)(self.compute)
+        return self._cached(item)
+
+    def cache_info(self):
+        """Hits and misses of the cache, or None if nothing is cached yet.
+        """
+        if self._cached is None:
+            return None
+        return self._cached.cache_info()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_cached'] = None
+        return state
+
+
+class ConvertT2S(CachedPipeline):
+    """Convert traditional Chinese to simplified Chinese using OpenCC.
+
+    Args:
+        cache_size (int, optional): Size of the LRU cache of conversions.
+        Defaults to 0, no cache.
+    """
+
+    def __init__(self, cache_size: int = 0):
+        super().__init__(cache_size)
         self.converter = OpenCC('t2s.json')
 
     def process(self, article):
-        return map(self.converter.convert, article)
+        return map(self.convert, article)
+
+    def convert(self, text):
+        if self.cache_size:
+            return self.cached(text)
+        return self.converter.convert(text)
 
+    def compute(self, text):
+        return self.converter.convert(text)
 
-class CutSentence(Pipeline):
+
+class CutSentence(CachedPipeline):
     """Cut sentences of an article into tokens using jieba.
+
+    With a cache, a phrase is split into the same blocks as `jieba.cut` does
+    internally, and the tokens of each block are cached, so that the output
+    is identical to `jieba.cut`.
+
+    Args:
+        cache_size (int, optional): Size of the LRU cache of tokens of blocks.
+        Defaults to 0, no cache.
     """
 
     def process(self, article):
         for phrase in article:
-            yield from jieba.cut(phrase)
+            yield from self.cut(phrase)
+
+    def cut(self, phrase):
+        if not self.cache_size:
+            return jieba.cut(phrase)
+        cached = self.cached
+        return [
+            w for block in jieba.re_han_default.split(phrase) if block
+            for w in cached(block)
+        ]
+
+    def compute(self, block):
+        return tuple(jieba.cut(block))
+
+
+def _log_cache_info(pipelines: List[Pipeline]):
+    """Log hits and misses of the caches of `pipelines` in this process.
+    """
+    for p in pipelines:
+        if not isinstance(p, CachedPipeline):
+            continue
+        info = p.cache_info()
+        if info is None:
+            continue
+        total = max(info.hits + info.misses, 1)
+        settings.LOGGER.info(
+            f'[{os.getpid()}] {p!r} cache: {info.hits} hits, {info.misses} misses '
+            f'({info.hits / total:.1%} hit rate), {info.currsize} entries.'
+        )
 
 
 class RemoveNonChineseWords(Pipeline):
@@ -70,7 +171,7 @@ class RemoveNonChineseWords(Pipeline):
         return filter(self.filter_func, article)
 
     def filter_func(self, s):
-        return all('\u4e00' < c < '\u9fff' for c in s)
+        return CHINESE_WORD.fullmatch(s) is not None
 
 
 class RemoveStopwords(Pipeline):
@@ -97,6 +198,142 @@ class RemoveStopwords(Pipeline):
         return w not in self.stopwords
 
 
+class Subsample(Pipeline):
+    """Drop frequent tokens at random, as word2vec does on every epoch, so
+    that a corpus is downsampled once ahead of training. Train on its output
+    with `--sample 0`.
+
+    A token counted `c` times is kept with probability
+    `(sqrt(c / (sample * total)) + 1) * sample * total / c`, the formula of
+    word2vec and gensim, where `total` is the number of words of the tokens
+    counted at least `min_count` times. Only tokens with a probability below 1
+    are stored.
+
+    Args:
+        vocab (Union[str, Dict[str, int]]): Path to a vocab artifact of the
+            processed corpus, see `utils/vocab.py`, or its token counts.
+        sample (float, optional): Threshold of the frequent tokens, as the
+            `sample` of gensim. Defaults to 1e-3.
+        min_count (int, optional): `min_count` of the training. Defaults to 5.
+        seed (int, optional): Seed of the random draws, which are seeded per
+            article with its content hash, so that they do not depend on the
+            process or shard processing it. Defaults to 1.
+    """
+
+    def __init__(self, vocab: Union[str, Dict[str, int]],
+                 sample: float = 1e-3, min_count: int = 5, seed: int = 1):
+        super().__init__()
+        counts = load_vocab(vocab)[0] if isinstance(vocab, str) else vocab
+        threshold = sample * sum(c for c in counts.values() if c >= min_count)
+        self.sample = sample
+        self.seed = seed
+        self.keep = {}
+        for w, c in counts.items():
+            p = ((c / threshold) ** 0.5 + 1) * threshold / c
+            if p < 1:
+                self.keep[w] = p
+
+    def process(self, article):
+        article = list(article)
+        rand = random.Random(self.seed << 64 | content_hash(article)).random
+        keep = self.keep
+        return [w for w in article if w not in keep or keep[w] > rand()]
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(sample={self.sample}, seed={self.seed})'
+
+
+class Deduplicate(Pipeline):
+    """Drop near-duplicate articles, by MinHash signatures of token shingles
+    and a bounded LSH index, see `utils/dedup.py`.
+
+    Called on its own, it returns an empty article for near-duplicates of
+    the articles it has seen. With `Processor`, it must be the last pipeline:
+    workers compute the signatures of the processed articles, and the single
+    writer holds the index and drops near-duplicates from the output.
+
+    Args:
+        threshold (float, optional): Estimated Jaccard similarity of shingles
+            from which articles are near-duplicates. Defaults to 0.8.
+        num_perm (int, optional): Length of the signatures. Defaults to 64.
+        bands (int, optional): Number of LSH bands. Defaults to 8.
+        shingle_size (int, optional): Number of tokens per shingle. Defaults to 5.
+        max_entries (int, optional): Number of recent articles indexed.
+            Defaults to 200000.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 8,
+                 shingle_size: int = 5, max_entries: int = 200000):
+        super().__init__()
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.max_entries = max_entries
+        self.minhash = MinHash(num_perm, shingle_size)
+        self._index = None
+
+    def signature(self, article: List[str]) -> np.ndarray:
+        return self.minhash.signature(article)
+
+    def index(self) -> MinHashLSH:
+        return MinHashLSH(self.num_perm, self.bands, self.threshold, self.max_entries)
+
+    def process(self, article):
+        article = list(article)
+        if self._index is None:
+            self._index = self.index()
+        return article if self._index.add(self.signature(article)) else []
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_index'] = None
+        return state
+
+
+def _split_dedup(pipelines: List[Pipeline]):
+    """Split a trailing `Deduplicate` off `pipelines`.
+
+    Returns:
+        Tuple[List[Pipeline], Deduplicate]: The other pipelines, and the
+        `Deduplicate` pipeline or None.
+
+    Raises:
+        ValueError: `Deduplicate` is not only the last pipeline.
+    """
+    positions = [i for i, p in enumerate(pipelines) if isinstance(p, Deduplicate)]
+    if not positions:
+        return list(pipelines), None
+    if positions != [len(pipelines) - 1]:
+        raise ValueError('Deduplicate must be the last pipeline, and appear once.')
+    return list(pipelines[:-1]), pipelines[-1]
+
+
+class DedupStats:
+    """Counts of the articles and tokens kept and dropped by `Deduplicate`.
+    """
+
+    def __init__(self):
+        self.kept = self.dropped = 0
+        self.kept_tokens = self.dropped_tokens = 0
+
+    def add(self, kept: bool, tokens: int):
+        if kept:
+            self.kept += 1
+            self.kept_tokens += tokens
+        else:
+            self.dropped += 1
+            self.dropped_tokens += tokens
+
+    def log(self):
+        articles = max(self.kept + self.dropped, 1)
+        tokens = max(self.kept_tokens + self.dropped_tokens, 1)
+        settings.LOGGER.info(
+            f'Dropped {self.dropped} near-duplicate articles '
+            f'({self.dropped / articles:.1%}) with {self.dropped_tokens} tokens '
+            f'({self.dropped_tokens / tokens:.1%} of the corpus).'
+        )
+
+
 class Write2File(Pipeline):
     """Write an article to file.
 
@@ -105,22 +342,477 @@ class Write2File(Pipeline):
         mode (str, optional): mode used to open the file. Default to 'w'.
         separator (str, optional): separator of tokens of the article.
         Default to whitespace.
+        max_sentence_length (int, optional): If set, articles are split into
+        lines of at most this many tokens. Default to None, one line per article.
     """
 
-    def __init__(self, path: str, mode: str = 'w', separator: str = ' '):
+    def __init__(self, path: str, mode: str = 'w', separator: str = ' ',
+                 max_sentence_length: int = None):
         super().__init__()
         self.path = path
         self.out = open(path, mode)
         self.separator = separator
+        self.max_sentence_length = max_sentence_length
 
     def process(self, article):
-        self.out.write(self.separator.join(article))
-        self.out.write('\n')
+        limit = self.max_sentence_length
+        if limit is None:
+            self.out.write(self.separator.join(article))
+            self.out.write('\n')
+            return article
+        article = list(article)
+        for i in range(0, max(len(article), 1), limit):
+            self.out.write(self.separator.join(article[i:i + limit]))
+            self.out.write('\n')
+        return article
+
+    def close(self):
+        self.out.close()
+
+
+class SegmentWriter:
+    """Write articles into numbered segments, which are committed atomically.
+
+    Articles `[k * segment_size, (k + 1) * segment_size)` of the input go to
+    segment `k`. A segment is written to a temporary file, renamed to
+    `part-{k:05d}.txt` once all its articles are written, and recorded in
+    `manifest.json` together with the index of its first article and its
+    article count. The committed segments survive a crash, so that processing
+    can resume from them. The positions in the source where segments end are
+    recorded separately in `input_offsets.json`, see `_seek_committed`.
+
+    Args:
+        folder (str): Folder of the segments and the manifest.
+        segment_size (int): Number of input articles per segment.
+        max_sentence_length (int, optional): See `Write2File`. Defaults to None.
+
+    Raises:
+        ValueError: The manifest in `folder` uses another segment size.
+    """
+
+    def __init__(self, folder: str, segment_size: int,
+                 max_sentence_length: int = None):
+        self.folder = folder
+        self.segment_size = segment_size
+        self.max_sentence_length = max_sentence_length
+        self.manifest_path = os.path.join(folder, 'manifest.json')
+        os.makedirs(folder, exist_ok=True)
+        self.manifest = {'segment_size': segment_size, 'segments': {}}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r') as f:
+                self.manifest = json.load(f)
+        if self.manifest['segment_size'] != segment_size:
+            raise ValueError(
+                f'{self.manifest_path} uses segment size '
+                f'{self.manifest["segment_size"]}, not {segment_size}.'
+            )
+        self.writers = {}
+        self.counts = {}
+
+    def committed(self) -> set:
+        """Indices of the committed segments.
+        """
+        return {int(k) for k in self.manifest['segments']}
+
+    def path(self, segment: int) -> str:
+        return os.path.join(self.folder, f'part-{segment:05d}.txt')
+
+    def write(self, segment: int, article: Iterable[str]):
+        """Write an article of `segment`, and commit the segment once it is full.
+
+        An article dropped from the output, e.g. by `Deduplicate`, is passed as
+        None, so that it still counts towards its segment.
+        """
+        if segment not in self.writers:
+            self.writers[segment] = Write2File(
+                f'{self.path(segment)}.tmp',
+                max_sentence_length=self.max_sentence_length)
+            self.counts[segment] = 0
+        if article is not None:
+            self.writers[segment](article)
+        self.counts[segment] += 1
+        if self.counts[segment] == self.segment_size:
+            self.commit(segment)
+
+    def commit(self, segment: int):
+        """Rename the segment to its final name and record it in the manifest.
+        """
+        writer = self.writers.pop(segment)
+        count = self.counts.pop(segment)
+        writer.close()
+        os.replace(writer.path, self.path(segment))
+        self.manifest['segments'][str(segment)] = {
+            'file': os.path.basename(self.path(segment)),
+            'start': segment * self.segment_size,
+            'articles': count,
+        }
+        tmp_path = f'{self.manifest_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def close(self):
+        """Commit all segments in progress, which are complete once the input
+        is exhausted.
+        """
+        for segment in sorted(self.writers):
+            self.commit(segment)
+
+    def merge(self, output_path: str):
+        """Concatenate the committed segments into `output_path` and remove them.
+
+        Raises:
+            RuntimeError: Some segments are missing.
+        """
+        segments = sorted(self.committed())
+        if segments != list(range(len(segments))):
+            raise RuntimeError(f'Missing segments in {self.folder}.')
+        tmp_path = f'{output_path}.tmp'
+        with open(tmp_path, 'wb') as out:
+            for segment in segments:
+                with open(self.path(segment), 'rb') as f:
+                    shutil.copyfileobj(f, out, 1 << 20)
+        os.replace(tmp_path, output_path)
+        shutil.rmtree(self.folder)
+
+
+def _seek_committed(articles: Iterable[Iterable[str]], folder: str,
+                    segment_size: int, committed: set):
+    """Resume a seekable source after its committed segments.
+
+    A source is seekable if it has a method `iter_from(position)`, which
+    yields articles after `position`, each with the position after it, e.g.
+    `LineArticles` with byte offsets. The position where each segment ends is
+    recorded in `{folder}/input_offsets.json` as the articles are read. The
+    source resumes after the longest run of committed segments `0, 1, ...`
+    whose end is recorded, so that their input is neither read nor parsed
+    again. Other sources are read from the start, and their committed
+    segments are only skipped in the output.
+
+    Args:
+        articles (Iterable[Iterable[str]]): Articles to process.
+        folder (str): Folder of the segments, see `SegmentWriter`.
+        segment_size (int): Number of articles per segment.
+        committed (set): Indices of the committed segments.
+
+    Returns:
+        Tuple[Iterable[Iterable[str]], int]: Articles from the resumed position,
+            and the index of their first segment.
+    """
+    if not hasattr(articles, 'iter_from'):
+        return articles, 0
+    offsets_path = os.path.join(folder, 'input_offsets.json')
+    offsets = {}
+    if os.path.exists(offsets_path):
+        with open(offsets_path, 'r') as f:
+            offsets = json.load(f)
+    first = 0
+    while first in committed and str(first) in offsets:
+        first += 1
+    start = offsets[str(first - 1)] if first > 0 else None
+
+    def positioned():
+        index = first * segment_size
+        for position, article in articles.iter_from(start):
+            index += 1
+            if index % segment_size == 0:
+                offsets[str(index // segment_size - 1)] = position
+                tmp_path = f'{offsets_path}.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump(offsets, f)
+                os.replace(tmp_path, offsets_path)
+            yield article
+
+    return positioned(), first
+
+
+def _segments(articles: Iterable[Iterable[str]],
+              segment_size: int = None,
+              skip: set = frozenset(),
+              first: int = 0):
+    """Split articles into consecutive segments of `segment_size` articles.
+
+    Args:
+        articles (Iterable[Iterable[str]]): Articles to split.
+        segment_size (int, optional): Number of articles per segment. Defaults
+            to None, which puts all articles in segment 0.
+        skip (set, optional): Segments to skip. Defaults to none.
+        first (int, optional): Index of the segment of the first article.
+            Defaults to 0.
+
+    Yields:
+        Tuple[int, Iterator[Iterable[str]]]: Index and articles of a segment.
+    """
+    if segment_size is None:
+        yield 0, iter(articles)
+        return
+    groups = groupby(enumerate(articles, first * segment_size),
+                     key=lambda x: x[0] // segment_size)
+    for segment, group in groups:
+        if segment not in skip:
+            yield segment, (article for _, article in group)
+
+
+def _chunks(articles: Iterable[Iterable[str]],
+            chunk_size: int = None,
+            chunk_bytes: int = 1 << 18,
+            max_chunk_size: int = 512) -> Iterator[List[List[str]]]:
+    """Group articles into chunks so that they can be sent through a `Queue`
+    with a single message.
+
+    A chunk is closed once it has `chunk_size` articles or its text reaches
+    `chunk_bytes`. The size of the text is approximated by the number of
+    characters, which is cheap to compute.
+
+    If `chunk_size` is None, the chunk size is adaptive: it starts from 1 so
+    that workers get busy as soon as possible, and doubles after each chunk
+    until `max_chunk_size` or the `chunk_bytes` budget is reached.
+
+    Args:
+        articles (Iterable[Iterable[str]]): Articles to group.
+        chunk_size (int, optional): Maximum number of articles in a chunk.
+            Defaults to None, which means adaptive.
+        chunk_bytes (int, optional): Approximate size budget of a chunk.
+            Defaults to 256K.
+        max_chunk_size (int, optional): Upper bound of the adaptive chunk size.
+            Defaults to 512.
+
+    Yields:
+        List[List[str]]: Chunks of articles.
+    """
+    adaptive = chunk_size is None
+    size = 1 if adaptive else max(chunk_size, 1)
+    chunk = []
+    nbytes = 0
+    for article in articles:
+        article = list(article)
+        chunk.append(article)
+        nbytes += sum(map(len, article))
+        if len(chunk) >= size or nbytes >= chunk_bytes:
+            yield chunk
+            chunk = []
+            nbytes = 0
+            if adaptive:
+                size = min(size * 2, max_chunk_size)
+    if chunk:
+        yield chunk
+
+
+def _fuse_filters(stopwords: set, chinese: bool) -> Callable:
+    """Build a single pass filter for `RemoveStopwords` and `RemoveNonChineseWords`.
+    """
+    match = CHINESE_WORD.fullmatch
+    if stopwords and chinese:
+        return lambda tokens: [w for w in tokens if w not in stopwords and match(w)]
+    if stopwords:
+        return lambda tokens: [w for w in tokens if w not in stopwords]
+    if chinese:
+        return lambda tokens: [w for w in tokens if match(w)]
+    return list
+
+
+def _fuse_run(convert: Callable, cut: Callable, token_filter: Callable) -> Callable:
+    """Build the function of a run of known pipelines: an optional `ConvertT2S`,
+    an optional `CutSentence` and a filter of tokens.
+    """
+    def run(article):
+        if convert is not None:
+            article = map(convert, article)
+        if cut is not None:
+            article = (w for phrase in article for w in cut(phrase))
+        return token_filter(article)
+    return run
+
+
+def compile_pipelines(pipelines: List[Pipeline]) -> Callable:
+    """Compile pipelines into a function processing an article.
+
+    Consecutive `ConvertT2S`, `CutSentence`, `RemoveNonChineseWords` and
+    `RemoveStopwords` are fused into one function, which converts and cuts
+    phrases in a single generator and filters tokens in a single pass. Other
+    pipelines, including subclasses of the known ones, are called as they are.
+
+    Args:
+        pipelines (List[Pipeline]): list of pipelines to compile.
+
+    Returns:
+        Callable: function mapping an article to the processed article.
+    """
+    stages = []
+    run = None
+
+    def close_run():
+        nonlocal run
+        if run is not None:
+            token_filter = _fuse_filters(run['stopwords'], run['chinese'])
+            stages.append(_fuse_run(run['convert'], run['cut'], token_filter))
+            run = None
+
+    def open_run():
+        nonlocal run
+        if run is None:
+            run = dict(convert=None, cut=None, stopwords=set(), chinese=False)
+        return run
+
+    for p in pipelines:
+        kind = type(p)
+        if kind is ConvertT2S:
+            close_run()
+            open_run()['convert'] = p.convert
+        elif kind is CutSentence:
+            if run is not None and (run['cut'] is not None or
+                                    run['stopwords'] or run['chinese']):
+                close_run()
+            open_run()['cut'] = p.cut
+        elif kind is RemoveStopwords:
+            open_run()['stopwords'] |= p.stopwords
+        elif kind is RemoveNonChineseWords:
+            open_run()['chinese'] = True
+        else:
+            close_run()
+            stages.append(p)
+    close_run()
+
+    if len(stages) == 1:
+        return stages[0]
+
+    def processor(article):
+        for stage in stages:
+            article = stage(article)
         return article
 
+    return processor
+
+
+class StageProfiler:
+    """Counters of the stages of `Processor.process_all`, for opt-in profiling.
+
+    Each stage accumulates `seconds`, a number of `calls`, and the numbers of
+    items going in and out of it: phrases or tokens for pipelines, articles
+    for the rest. Pipelines and parsing are timed in CPU time, waits on
+    queues and writes in wall time. Queue depths are sampled, and named
+    counters, e.g. `writer/bytes`, are summed.
+
+    Profilers of different processes are combined with `merge` of their
+    `summary`.
+
+    Args:
+        interval (float, optional): Seconds between periodic logs. Defaults to 30.
+    """
+
+    FIELDS = ('seconds', 'calls', 'items_in', 'items_out')
 
-def _worker(pipelines: List[Pipeline], source: Queue, sink: Queue):
-    """Process articles from `soure` and put the processed article into `sink`.
+    def __init__(self, interval: float = 30):
+        self.interval = interval
+        self.stages = {}
+        self.queues = {}
+        self.counters = {}
+        self.start = self.last_log = time.monotonic()
+
+    def add(self, stage: str, seconds: float = 0,
+            items_in: int = 0, items_out: int = 0):
+        stats = self.stages.get(stage)
+        if stats is None:
+            stats = self.stages[stage] = dict.fromkeys(self.FIELDS, 0)
+        stats['seconds'] += seconds
+        stats['calls'] += 1
+        stats['items_in'] += items_in
+        stats['items_out'] += items_out
+
+    def count(self, counter: str, n: int):
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def sample_queue(self, name: str, queue: Queue):
+        try:
+            depth = queue.qsize()
+        except NotImplementedError:  # macOS
+            return
+        stats = self.queues.setdefault(name, {'samples': 0, 'total': 0, 'max': 0})
+        stats['samples'] += 1
+        stats['total'] += depth
+        stats['max'] = max(stats['max'], depth)
+
+    def merge(self, summary: dict):
+        """Add the counters of the `summary` of another profiler.
+        """
+        for stage, other in summary['stages'].items():
+            stats = self.stages.setdefault(stage, dict.fromkeys(self.FIELDS, 0))
+            for field in self.FIELDS:
+                stats[field] += other[field]
+        for name, other in summary['queues'].items():
+            stats = self.queues.setdefault(name, {'samples': 0, 'total': 0, 'max': 0})
+            stats['samples'] += other['samples']
+            stats['total'] += other['total']
+            stats['max'] = max(stats['max'], other['max'])
+        for counter, n in summary['counters'].items():
+            self.count(counter, n)
+
+    def due(self) -> bool:
+        """Whether a periodic log is due, which resets the timer.
+        """
+        now = time.monotonic()
+        if now - self.last_log < self.interval:
+            return False
+        self.last_log = now
+        return True
+
+    def summary(self) -> dict:
+        elapsed = time.monotonic() - self.start
+        queues = {
+            name: dict(stats, mean=stats['total'] / max(stats['samples'], 1))
+            for name, stats in self.queues.items()
+        }
+        summary = {
+            'elapsed': elapsed,
+            'stages': {stage: dict(stats) for stage, stats in self.stages.items()},
+            'queues': queues,
+            'counters': dict(self.counters),
+        }
+        if 'writer/bytes' in self.counters:
+            summary['writer_bytes_per_sec'] = self.counters['writer/bytes'] / max(elapsed, 1e-9)
+        return summary
+
+    def log(self, prefix: str):
+        logger = settings.LOGGER
+        summary = self.summary()
+        for stage, stats in summary['stages'].items():
+            logger.info(
+                f'[profile] {prefix} {stage}: {stats["seconds"]:.1f}s in '
+                f'{stats["calls"]} calls, {stats["items_in"]} in, '
+                f'{stats["items_out"]} out.'
+            )
+        for name, stats in summary['queues'].items():
+            logger.info(
+                f'[profile] {prefix} queue {name}: mean depth {stats["mean"]:.1f}, '
+                f'max {stats["max"]}.'
+            )
+        if 'writer_bytes_per_sec' in summary:
+            logger.info(
+                f'[profile] {prefix} writer: '
+                f'{summary["writer_bytes_per_sec"] / (1 << 20):.2f} MB/s.'
+            )
+
+
+def _profiled(articles: Iterable[Iterable[str]], profiler: StageProfiler,
+              stage: str) -> Iterator[Iterable[str]]:
+    """Iterate over `articles`, adding the CPU time of producing each of them
+    to `stage` of `profiler`.
+    """
+    clock = time.process_time
+    articles = iter(articles)
+    while True:
+        start = clock()
+        try:
+            article = next(articles)
+        except StopIteration:
+            return
+        profiler.add(stage, clock() - start, 0, 1)
+        yield article
+
+
+def _make_processor(pipelines: List[Pipeline], fuse: bool = True,
+                    profiler: StageProfiler = None):
+    """Build the function that processes an article inside a worker process.
 
     Note:
         `ConvertT2S` pipeline needs to be reinitialized in order to avoid problems
@@ -128,115 +820,463 @@ def _worker(pipelines: List[Pipeline], source: Queue, sink: Queue):
 
     Args:
         pipelines (List[Pipeline]): list of pipelines to process articles.
-        source (Queue): source of articles to process.
-        sink (Queue): sink of processed articles.
+        fuse (bool, optional): Whether to compile the pipelines with
+            `compile_pipelines`. Defaults to True.
+        profiler (StageProfiler, optional): If set, each pipeline is timed
+            separately, as `pipeline/{index}:{name}`, so they are not fused.
+            Defaults to None.
+
+    Returns:
+        Tuple[Callable, List[Pipeline]]: function mapping an article to the
+        processed article, and the pipelines it uses.
     """
     pipelines = list(pipelines)
     for i, p in enumerate(pipelines):
         if isinstance(p, ConvertT2S):
-            pipelines[i] = ConvertT2S()
+            pipelines[i] = ConvertT2S(p.cache_size)
+
+    if profiler is not None:
+        stages = [(f'pipeline/{i}:{p!r}', p) for i, p in enumerate(pipelines)]
+        clock = time.process_time
+
+        def profiled_processor(article):
+            article = list(article)
+            for stage, p in stages:
+                start = clock()
+                processed = list(p(article))
+                profiler.add(stage, clock() - start, len(article), len(processed))
+                article = processed
+            return article
+
+        return profiled_processor, pipelines
+
+    if fuse:
+        return compile_pipelines(pipelines), pipelines
 
     def processor(article):
         for p in pipelines:
             article = p(article)
         return article
 
+    return processor, pipelines
+
+
+def _worker(pipelines: List[Pipeline], source: Queue, sink: Queue,
+            fuse: bool = True, profile_interval: float = None):
+    """Process chunks of articles from `soure` and put the processed chunks
+    into `sink`.
+
+    Args:
+        pipelines (List[Pipeline]): list of pipelines to process articles.
+        source (Queue): source of chunks of articles to process.
+        sink (Queue): sink of chunks of processed articles.
+        fuse (bool, optional): Whether to fuse the pipelines. Defaults to True.
+        profile_interval (float, optional): If set, the worker is profiled, and
+            its cumulative `StageProfiler.summary` is put into `sink` as
+            `('STATS', pid, summary)` at this interval in seconds and at exit.
+            Defaults to None.
+    """
+    pipelines, dedup = _split_dedup(pipelines)
+
+    def signatures(articles):
+        if dedup is None:
+            return None
+        return np.array([dedup.signature(a) for a in articles], dtype=np.uint32)
+
+    if profile_interval is None:
+        processor, pipelines = _make_processor(pipelines, fuse)
+        while True:
+            chunk = source.get()
+            if chunk == 'EXIT':
+                _log_cache_info(pipelines)
+                return
+            seq, segment, articles = chunk
+            processed = [list(processor(article)) for article in articles]
+            sink.put((seq, segment, processed, signatures(processed)))
+
+    profiler = StageProfiler(profile_interval)
+    processor, pipelines = _make_processor(pipelines, fuse, profiler)
+    dedup_stage = f'pipeline/{len(pipelines)}:{dedup!r}'
     while True:
-        article = source.get()
-        if article == 'EXIT':
+        start = time.perf_counter()
+        chunk = source.get()
+        profiler.add('worker/get', time.perf_counter() - start)
+        if chunk == 'EXIT':
+            _log_cache_info(pipelines)
+            sink.put(('STATS', os.getpid(), profiler.summary()))
             return
-        article = list(processor(article))
-        sink.put(article)
+        seq, segment, articles = chunk
+        processed = [list(processor(article)) for article in articles]
+        start = time.process_time()
+        processed_signatures = signatures(processed)
+        if dedup is not None:
+            profiler.add(dedup_stage, time.process_time() - start,
+                         len(processed), len(processed))
+        start = time.perf_counter()
+        sink.put((seq, segment, processed, processed_signatures))
+        profiler.add('worker/put', time.perf_counter() - start, len(processed))
+        if profiler.due():
+            sink.put(('STATS', os.getpid(), profiler.summary()))
 
 
-def _writer(path: str, sink: Queue):
-    """Write articles from `processor.sink` to disk.
+def _writer(path: str, sink: Queue, segment_size: int = None,
+            in_flight: BoundedSemaphore = None,
+            profile_queue: Queue = None, profile_interval: float = 30,
+            dedup: Deduplicate = None, max_sentence_length: int = None):
+    """Write chunks of articles from `processor.sink` to disk.
 
     Args:
-        path (str): Path to the file on disk.
-        sink (Queue): Processed articles to write on disk.
+        path (str): Path to the file on disk, or the folder of segments if
+            `segment_size` is set.
+        sink (Queue): Chunks of processed articles to write on disk.
+        segment_size (int, optional): Number of articles per segment, see
+            `SegmentWriter`. Defaults to None, which writes a single file.
+        in_flight (BoundedSemaphore, optional): If set, chunks are written in
+            the order of their sequence numbers, and the semaphore is released
+            after each chunk is written. Defaults to None, which writes chunks
+            as they come.
+        profile_queue (Queue, optional): If set, the writer is profiled. It
+            combines its profile with the `STATS` of the workers, logs them
+            every `profile_interval` seconds, and puts the final summary into
+            this queue at exit. Defaults to None.
+        profile_interval (float, optional): Seconds between periodic logs.
+            Defaults to 30.
+        dedup (Deduplicate, optional): If set, the writer indexes the
+            signatures of the chunks and drops near-duplicates. Defaults to None.
+        max_sentence_length (int, optional): See `Write2File`. Defaults to None.
     """
-    writer = Write2File(path)
+    index = dedup.index() if dedup is not None else None
+    dedup_stats = DedupStats()
+    profiler = None
+    worker_stats = {}
+    if profile_queue is not None:
+        profiler = StageProfiler(profile_interval)
+
+    def combined():
+        total = StageProfiler()
+        for summary in worker_stats.values():
+            total.merge(summary)
+        total.merge(profiler.summary())
+        total.start = profiler.start
+        return total
+
+    if segment_size is None:
+        writer = Write2File(path, max_sentence_length=max_sentence_length)
+    else:
+        writer = SegmentWriter(path, segment_size, max_sentence_length)
     logger = settings.LOGGER
     count = 0
+    next_seq = 0
+    pending = {}
+
+    def write(segment, chunk, signatures):
+        nonlocal count
+        start = time.perf_counter()
+        written = []
+        for i, article in enumerate(chunk):
+            if index is not None:
+                kept = index.add(signatures[i])
+                dedup_stats.add(kept, len(article))
+                if not kept:
+                    article = None
+            if segment_size is not None:
+                writer.write(segment, article)
+            elif article is not None:
+                writer(article)
+            if article is not None:
+                written.append(article)
+        if profiler is not None:
+            profiler.add('writer/write', time.perf_counter() - start,
+                         len(chunk), len(written))
+            profiler.count('writer/bytes', sum(
+                len(' '.join(article).encode('utf-8')) + 1 for article in written))
+        count += len(chunk)
+        logger.progress(f'{count} articles processed.')
+
     while True:
-        article = sink.get()
-        if article == 'EXIT':
+        start = time.perf_counter()
+        chunk = sink.get()
+        if profiler is not None:
+            profiler.add('writer/get', time.perf_counter() - start)
+        if chunk == 'EXIT':
+            writer.close()
             logger.info(f'All {count} articles saved to {path}.')
+            if index is not None:
+                dedup_stats.log()
+            if profiler is not None:
+                profile_queue.put(combined().summary())
             return
+        if chunk[0] == 'STATS':
+            _, pid, summary = chunk
+            worker_stats[pid] = summary
+            continue
+        if profiler is not None and profiler.due():
+            combined().log('workers and writer')
+        seq, segment, chunk, signatures = chunk
+        if in_flight is None:
+            write(segment, chunk, signatures)
+            continue
+        # reorder buffer, bounded by the number of chunks in flight
+        pending[seq] = (segment, chunk, signatures)
+        while next_seq in pending:
+            write(*pending.pop(next_seq))
+            next_seq += 1
+            in_flight.release()
+
+
+def _get_from(queue: Queue, proc: Process, timeout: float = 1):
+    """Get an item put into `queue` by `proc`, or None if `proc` exits without
+    putting any.
+    """
+    while True:
+        try:
+            return queue.get(timeout=timeout)
+        except Empty:
+            if not proc.is_alive():
+                try:
+                    return queue.get(timeout=timeout)
+                except Empty:
+                    return None
+
+
+def _shard_worker(pipelines: List[Pipeline],
+                  input_path: str, start: int, end: int,
+                  parse: Callable[[bytes], Iterable[str]],
+                  shard_path: str,
+                  fuse: bool = True,
+                  max_sentence_length: int = None):
+    """Parse, process and write the lines of `input_path` in `[start, end)`.
+
+    Args:
+        pipelines (List[Pipeline]): list of pipelines to process articles.
+        input_path (str): Path to the line-based input file.
+        start (int): Start offset of the shard.
+        end (int): End offset of the shard.
+        parse (Callable[[bytes], Iterable[str]]): Function to parse a line into
+            an article. Lines for which it returns None are skipped.
+        shard_path (str): Path to the output shard. With a trailing `Deduplicate`
+            pipeline, the signatures of its articles are saved to
+            `{shard_path}.minhash.npy`.
+        fuse (bool, optional): Whether to fuse the pipelines. Defaults to True.
+        max_sentence_length (int, optional): See `Write2File`. Defaults to None.
+    """
+    pipelines, dedup = _split_dedup(pipelines)
+    processor, pipelines = _make_processor(pipelines, fuse)
+    writer = Write2File(shard_path, max_sentence_length=max_sentence_length)
+    signatures = []
+    count = 0
+    for line in iter_lines(input_path, start, end):
+        article = parse(line)
+        if article is None:
+            continue
+        article = list(processor(article))
         writer(article)
+        if dedup is not None:
+            signatures.append(dedup.signature(article))
         count += 1
-        if count % 10000 == 0:
-            logger.info(f'{count} articles processed.')
+        settings.LOGGER.progress(f'{count} articles processed into {shard_path}.')
+    writer.close()
+    if dedup is not None:
+        np.save(f'{shard_path}.minhash.npy',
+                np.array(signatures, dtype=np.uint32).reshape(count, dedup.num_perm))
+    _log_cache_info(pipelines)
+    settings.LOGGER.info(f'{count} articles saved to {shard_path}.')
 
 
 class Processor(Pipeline):
+    """Process articles with a list of pipelines.
 
-    def __init__(self,  pipelines=[]):
+    Args:
+        pipelines (List[Pipeline], optional): pipelines to process articles.
+        fuse (bool, optional): Whether to compile the pipelines into one fused
+            function, see `compile_pipelines`. Defaults to True.
+        max_sentence_length (int, optional): If set, processed articles are
+            written as lines of at most this many tokens, instead of one line
+            per article, which gensim would cut every 10000 tokens. Defaults
+            to None.
+    """
+
+    def __init__(self,  pipelines=[], fuse=True, max_sentence_length=None):
         self.pipelines = pipelines
+        self.fuse = fuse
+        self.max_sentence_length = max_sentence_length
         self.logger = settings.LOGGER
+        self._processor = None
+        self._pipelines = None
 
     def process(self, article):
-        for func in self.pipelines:
-            article = func(article)
-        return article
+        if self._processor is None:
+            self._processor, self._pipelines = _make_processor(
+                self.pipelines, self.fuse)
+        return self._processor(article)
 
     def process_all_single_thread(self,
                                   articles: Iterable[Iterable[str]],
-                                  output_path: str):
+                                  output_path: str,
+                                  resumable: bool = False,
+                                  segment_size: int = 100000):
         """Process all articles within a single thread.
 
         Args:
             articles (Iterable[Iterable[str]]): Articles to process.
             output_path (str): Path to the output file on disk to save processed articles.
+            resumable (bool, optional): Whether to write committed segments and
+                resume from them, see `process_all`. Defaults to False.
+            segment_size (int, optional): Number of articles per segment.
+                Defaults to 100000.
         """
         self.logger.info('Begin to process all articles ...')
 
+        pipelines, dedup = _split_dedup(self.pipelines)
+        processor, pipelines = _make_processor(pipelines, self.fuse)
+        index = dedup.index() if dedup is not None else None
+        dedup_stats = DedupStats()
         count = 0
-        writer = Write2File(output_path)
-        for article in articles:
-            article = self.process(article)
-            writer.process(article)
-            count += 1
-            if count % 10000 == 0:
-                self.logger.info(f'{count} articles processed.')
+        if resumable:
+            writer = SegmentWriter(f'{output_path}.segments', segment_size,
+                                   self.max_sentence_length)
+            skip = writer.committed()
+            articles, first = _seek_committed(articles, writer.folder,
+                                              segment_size, skip)
+            self._log_resume(skip, segment_size, first)
+        else:
+            writer = Write2File(output_path,
+                                max_sentence_length=self.max_sentence_length)
+            segment_size, skip, first = None, set(), 0
+        for segment, segment_articles in _segments(articles, segment_size,
+                                                   skip, first):
+            for article in segment_articles:
+                article = list(processor(article))
+                if index is not None:
+                    kept = index.add(dedup.signature(article))
+                    dedup_stats.add(kept, len(article))
+                    if not kept:
+                        article = None
+                if resumable:
+                    writer.write(segment, article)
+                elif article is not None:
+                    writer.process(article)
+                count += 1
+                self.logger.progress(f'{count} articles processed.')
+        writer.close()
+        if resumable:
+            writer.merge(output_path)
+        _log_cache_info(pipelines)
+        if index is not None:
+            dedup_stats.log()
 
         self.logger.info(
             f'Finish writing {count} processed articles to {output_path}')
 
+    def _log_resume(self, committed: set, segment_size: int, first: int):
+        if committed:
+            self.logger.info(
+                f'Resume: skip {len(committed)} committed segments '
+                f'of {segment_size} articles.'
+            )
+        if first:
+            self.logger.info(
+                f'Resume: seek the input past the first {first} segments.')
+
     def process_all(self,
                     articles: Iterable[Iterable[str]],
                     output_path: str,
                     use_multiprocessing: bool = True,
-                    workers: int = 4, max_queue_size: int = 1000):
+                    workers: int = 4, max_queue_size: int = 1000,
+                    chunk_size: int = None, chunk_bytes: int = 1 << 18,
+                    resumable: bool = False, segment_size: int = 100000,
+                    ordered: bool = False, profile: bool = False,
+                    profile_interval: float = 30, profile_path: str = None):
         """Process all articles.
 
+        Articles are sent to the workers, and from the workers to the writer,
+        in chunks, so that pickling and locking are paid once per chunk
+        instead of once per article.
+
+        If `ordered` is set, the articles are written in the order of the input.
+        Chunks are numbered, and the writer keeps a reorder buffer, which is
+        bounded by allowing at most `2 * queue size + workers` chunks in flight.
+
+        If `resumable` is set, the output is written into segments of
+        `segment_size` input articles in the folder `{output_path}.segments`,
+        see `SegmentWriter`. If a previous run crashed, the articles of its
+        committed segments are skipped. A seekable source, e.g. `LineArticles`,
+        resumes from the recorded position after the committed segments, see
+        `_seek_committed`; other sources are read again from the start, and
+        only the output of their committed segments is skipped. `output_path`
+        only appears once all segments are committed and merged, so a partial
+        output is never left behind. Resuming requires the same input and
+        segment size.
+
+        A trailing `Deduplicate` pipeline drops near-duplicate articles: workers
+        compute their signatures, and the writer checks them against a single
+        index, so duplicates are found across workers. In ordered mode the
+        first article in input order is kept. The index does not survive a
+        resume.
+
+        If `profile` is set, the stages are profiled with `StageProfiler`: the
+        parsing of `articles` and the puts into `source` in this process, each
+        pipeline, in CPU time and items in/out, and the queue waits in the
+        workers, and the writes and bytes/s of the writer, together with
+        sampled depths of both queues. Pipelines are not fused then, so that
+        each of them can be timed. Profiles are logged every
+        `profile_interval` seconds, and their combined summary at the end, as
+        JSON.
+
         Args:
             articles (Iterable[Iterable[str]]): Articles to process.
             output_path (str): Path to the output file on disk to save processed articles.
             use_multiprocessing (bool, optional): Whether to use multi processes. Defaults to True.
             workers (int, optional): Number of workers to process articles. Defaults to 4.
-            max_queue_size (int, optional): Maxixum size for both queues source and sink.
-                Defaults to 1000.
+            max_queue_size (int, optional): Approximate maximum number of articles
+                buffered in both queues source and sink. Defaults to 1000.
+            chunk_size (int, optional): Number of articles per chunk. Use 1 to send
+                articles one by one. Defaults to None, which adapts the chunk size
+                to `chunk_bytes`.
+            chunk_bytes (int, optional): Approximate size budget of the text in a chunk.
+                Defaults to 256K.
+            resumable (bool, optional): Whether to write committed segments and
+                resume from them. Defaults to False.
+            segment_size (int, optional): Number of articles per segment.
+                Defaults to 100000.
+            ordered (bool, optional): Whether to keep the order of the input.
+                Defaults to False.
+            profile (bool, optional): Whether to profile the stages. Only used
+                with multiprocessing. Defaults to False.
+            profile_interval (float, optional): Seconds between periodic logs
+                of the profile. Defaults to 30.
+            profile_path (str, optional): Path to save the JSON summary of the
+                profile. Defaults to None.
+
+        Returns:
+            dict: Summary of the profile if `profile` is set, otherwise None.
         """
 
         if not use_multiprocessing:
-            return self.process_all_single_thread(articles, output_path)
+            return self.process_all_single_thread(
+                articles, output_path, resumable, segment_size)
 
         workers = max(workers, 1)
+        _, dedup = _split_dedup(self.pipelines)
 
         self.logger.info('Begin to process all articles ...')
 
-        # create Queue for multiprocessing
-        source = Queue(maxsize=max_queue_size)
-        sink = Queue(maxsize=max_queue_size)
+        # create Queue for multiprocessing, sized in chunks
+        max_chunk_size = 512 if chunk_size is None else max(chunk_size, 1)
+        queue_size = max(max_queue_size // max_chunk_size, 2 * workers)
+        source = Queue(maxsize=queue_size)
+        sink = Queue(maxsize=queue_size)
+
+        profiler = StageProfiler(profile_interval) if profile else None
+        profile_queue = Queue() if profile else None
 
         # create worker processes
         worker_processes = []
         for _ in range(workers):
             worker_proc = Process(
                 target=_worker,
-                args=(self.pipelines, source, sink)
+                args=(self.pipelines, source, sink, self.fuse,
+                      profile_interval if profile else None)
             )
             worker_proc.daemon = True
             worker_proc.start()
@@ -244,17 +1284,48 @@ class Processor(Pipeline):
         self.logger.info(f'{workers} processes start to process articles.')
 
         # create writer process
-        writer_proc = Process(target=_writer, args=(output_path, sink))
+        in_flight = None
+        if ordered:
+            in_flight = BoundedSemaphore(2 * queue_size + workers)
+        if resumable:
+            segment_folder = f'{output_path}.segments'
+            skip = SegmentWriter(segment_folder, segment_size).committed()
+            articles, first = _seek_committed(articles, segment_folder,
+                                              segment_size, skip)
+            self._log_resume(skip, segment_size, first)
+            writer_args = (segment_folder, sink, segment_size, in_flight)
+        else:
+            segment_size, skip, first = None, set(), 0
+            writer_args = (output_path, sink, None, in_flight)
+        writer_args += (profile_queue, profile_interval, dedup,
+                        self.max_sentence_length)
+        writer_proc = Process(target=_writer, args=writer_args)
         writer_proc.daemon = True
         writer_proc.start()
         self.logger.info(
             f'A process starts to write processed article to disk.')
 
         # put articles into source for workers to process
+        if profile:
+            articles = _profiled(articles, profiler, 'source/parse')
         count = 0
-        for article in articles:
-            source.put(article)
-            count += 1
+        seq = 0
+        for segment, segment_articles in _segments(articles, segment_size,
+                                                   skip, first):
+            for chunk in _chunks(segment_articles, chunk_size, chunk_bytes,
+                                 max_chunk_size):
+                start = time.perf_counter()
+                if in_flight is not None:
+                    in_flight.acquire()
+                source.put((seq, segment, chunk))
+                seq += 1
+                count += len(chunk)
+                if profile:
+                    profiler.add('source/put', time.perf_counter() - start, len(chunk))
+                    profiler.sample_queue('source', source)
+                    profiler.sample_queue('sink', sink)
+                    if profiler.due():
+                        profiler.log('main')
         for _ in range(workers):
             source.put('EXIT')
 
@@ -263,7 +1334,243 @@ class Processor(Pipeline):
         self.logger.info(f'Finish processing {count} articles.')
 
         sink.put('EXIT')
+        summary = None
+        if profile:
+            # get before join, the writer only exits once its queue is flushed
+            writer_summary = _get_from(profile_queue, writer_proc)
+            if writer_summary is not None:
+                profiler.merge(writer_summary)
+            summary = profiler.summary()
         writer_proc.join()
+        if writer_proc.exitcode != 0:
+            raise RuntimeError('The writer process failed.')
+        if resumable:
+            SegmentWriter(segment_folder, segment_size).merge(output_path)
+        if profile:
+            self.logger.metrics('profile', summary)
+            if profile_path is not None:
+                with open(profile_path, 'w') as f:
+                    json.dump(summary, f, indent=2)
+        return summary
+
+    def process_incremental(self,
+                            articles: Iterable[Iterable[str]],
+                            folder: str,
+                            merge_path: str = None,
+                            use_multiprocessing: bool = True,
+                            workers: int = 4, max_queue_size: int = 1000,
+                            chunk_size: int = None, chunk_bytes: int = 1 << 18):
+        """Process only the articles that are new since the previous run.
+
+        Articles are keyed by a hash of their content, see `utils/incremental.py`.
+        Articles whose hash is in the index of `folder` are reused, the others
+        are processed with `process_all`, in order, and appended to `folder` as
+        a new shard. Lines of articles which are no longer in the input, e.g.
+        changed or deleted ones, are then removed from their shards.
+
+        The index is tied to the pipelines by their repr. Copies of an article
+        share its hash, so they are all reused by the runs after the first.
+
+        Args:
+            articles (Iterable[Iterable[str]]): All articles of the input.
+            folder (str): Folder of the shards and their index.
+            merge_path (str, optional): If set, the shards are concatenated
+                into this file. Defaults to None.
+            use_multiprocessing (bool, optional): Whether to use multi processes.
+                Defaults to True.
+            workers (int, optional): Number of workers. Defaults to 4.
+            max_queue_size (int, optional): See `process_all`. Defaults to 1000.
+            chunk_size (int, optional): See `process_all`. Defaults to None.
+            chunk_bytes (int, optional): See `process_all`. Defaults to 256K.
+
+        Returns:
+            dict: Numbers of `reused`, `recomputed` and `removed` articles.
+
+        Raises:
+            ValueError: The pipelines contain `Deduplicate`, or
+                `max_sentence_length` is set.
+        """
+        if _split_dedup(self.pipelines)[1] is not None:
+            raise ValueError(
+                'Deduplicate drops articles, but incremental processing keeps '
+                'one line per input article in its index.')
+        if self.max_sentence_length is not None:
+            raise ValueError(
+                'max_sentence_length splits articles, but incremental processing '
+                'keeps one line per input article in its index.')
+        index = ShardIndex(folder, repr(self.pipelines))
+        seen = array('Q')
+        new_hashes = array('Q')
+        reused = 0
+
+        def new_articles():
+            nonlocal reused
+            for article in articles:
+                article = list(article)
+                h = content_hash(article)
+                seen.append(h)
+                if h in index:
+                    reused += 1
+                    continue
+                new_hashes.append(h)
+                yield article
+
+        self.logger.info(
+            f'Incremental processing into {folder}, '
+            f'{len(index)} articles indexed.')
+        shard = index.next_shard()
+        tmp_path = f'{index.path(shard)}.tmp'
+        self.process_all(new_articles(), tmp_path, use_multiprocessing,
+                         workers, max_queue_size, chunk_size, chunk_bytes,
+                         ordered=True)
+        if new_hashes:
+            index.add(shard, tmp_path, np.frombuffer(new_hashes, dtype=np.uint64))
+        else:
+            os.remove(tmp_path)
+        removed = index.compact(np.frombuffer(seen, dtype=np.uint64))
+        self.logger.info(
+            f'{reused} articles reused, {len(new_hashes)} recomputed, '
+            f'{removed} removed.')
+        if merge_path is not None:
+            index.merge(merge_path)
+            self.logger.info(f'Merged {len(index.shards())} shards into {merge_path}')
+        return {'reused': reused, 'recomputed': len(new_hashes), 'removed': removed}
+
+    def process_shards(self,
+                       input_path: str,
+                       parse: Callable[[bytes], Iterable[str]],
+                       output_path: str,
+                       workers: int = 4,
+                       merge: bool = True):
+        """Process a line-based file, e.g. JSON lines, in shards.
+
+        The file is split into line-aligned byte ranges, one per worker. Each
+        worker reads its own range through mmap, parses the lines with `parse`,
+        and writes its own output shard, so the parent process does no parsing
+        and no IPC.
+
+        With a trailing `Deduplicate` pipeline, workers save the signatures of
+        their articles next to their shards, and near-duplicates across all
+        shards are dropped while merging them.
+
+        Args:
+            input_path (str): Path to the line-based input file.
+            parse (Callable[[bytes], Iterable[str]]): Function to parse a line into
+                an article. It needs to be picklable, e.g. a module level function.
+            output_path (str): Path to the output file. If `merge` is False, it is
+                a folder containing shards, readable by `PathLineSentences`.
+            workers (int, optional): Number of workers. Defaults to 4.
+            merge (bool, optional): Whether to concatenate the shards into
+                `output_path`. Defaults to True.
+
+        Raises:
+            ValueError: The pipelines contain `Deduplicate` and `merge` is
+                False or `max_sentence_length` is set.
+        """
+        _, dedup = _split_dedup(self.pipelines)
+        if dedup is not None and not merge:
+            raise ValueError('Deduplicate drops near-duplicates while merging shards.')
+        if dedup is not None and self.max_sentence_length is not None:
+            raise ValueError(
+                'Deduplicate matches one signature per line of the shards, '
+                'which max_sentence_length splits.')
+        workers = max(workers, 1)
+        ranges = line_ranges(input_path, workers)
+        folder = output_path if not merge else f'{output_path}.shards'
+        os.makedirs(folder, exist_ok=True)
+        shard_paths = [
+            os.path.join(folder, f'part-{i:05d}.txt') for i in range(len(ranges))
+        ]
+
+        self.logger.info(
+            f'Begin to process {input_path} in {len(ranges)} shards ...')
+        worker_processes = []
+        for (start, end), shard_path in zip(ranges, shard_paths):
+            worker_proc = Process(
+                target=_shard_worker,
+                args=(self.pipelines, input_path, start, end, parse,
+                      shard_path, self.fuse, self.max_sentence_length)
+            )
+            worker_proc.daemon = True
+            worker_proc.start()
+            worker_processes.append(worker_proc)
+        for p in worker_processes:
+            p.join()
+        failed = [p.exitcode for p in worker_processes if p.exitcode != 0]
+        if failed:
+            raise RuntimeError(f'{len(failed)} shard workers failed.')
+
+        if not merge:
+            self.logger.info(f'Shards saved to {folder}.')
+            return
+        tmp_path = f'{output_path}.tmp'
+        index = dedup.index() if dedup is not None else None
+        dedup_stats = DedupStats()
+        with open(tmp_path, 'wb') as out:
+            for shard_path in shard_paths:
+                with open(shard_path, 'rb') as f:
+                    if index is None:
+                        shutil.copyfileobj(f, out, 1 << 20)
+                        continue
+                    signatures = np.load(f'{shard_path}.minhash.npy')
+                    for line, signature in zip(f, signatures):
+                        kept = index.add(signature)
+                        dedup_stats.add(kept, len(line.split()))
+                        if kept:
+                            out.write(line)
+        os.replace(tmp_path, output_path)
+        shutil.rmtree(folder)
+        if index is not None:
+            dedup_stats.log()
+        self.logger.info(f'Finish writing processed articles to {output_path}')
 
     def __repr__(self):
         return f'Processor(pipelines={repr(self.pipelines)}'
+
+
+def parse_tokens(line: bytes) -> List[str]:
+    """Parse a line of a processed corpus, for `Processor.process_shards`.
+    """
+    return line.decode('utf-8').split()
+
+
+def subsample_corpus(input_path: str, output_path: str, sample: float = 1e-3,
+                     vocab_path: str = None, max_sentence_length: int = None,
+                     workers: int = 4, min_count: int = 5):
+    """Downsample the frequent tokens of a processed corpus once, with
+    `Subsample`, and optionally split its lines, so that every epoch of
+    training reads less data.
+
+    Args:
+        input_path (str): Path to the processed corpus, one article per line.
+        output_path (str): Path to the downsampled corpus.
+        sample (float, optional): See `Subsample`. 0 only splits the lines.
+            Defaults to 1e-3.
+        vocab_path (str, optional): Vocab artifact of `input_path`. It is
+            loaded if it was counted from `input_path` as it is, otherwise
+            the vocab is counted and saved to it. Defaults
+            to None, which counts the vocab without saving it.
+        max_sentence_length (int, optional): See `Processor`. Defaults to None.
+        workers (int, optional): Number of workers. Defaults to 4.
+        min_count (int, optional): See `Subsample`. Defaults to 5.
+    """
+    logger = settings.LOGGER
+    if not sample:
+        processor = Processor([], max_sentence_length=max_sentence_length)
+        processor.process_shards(input_path, parse_tokens, output_path, workers)
+        return
+    if vocab_path is not None and is_vocab_of(vocab_path, input_path):
+        counts = load_vocab(vocab_path)[0]
+    else:
+        logger.info(f'Counting vocab of {input_path} ...')
+        counts, sentences, words = count_vocab(input_path, workers)
+        if vocab_path is not None:
+            save_vocab(vocab_path, counts, sentences, words, input_path)
+    subsample = Subsample(counts, sample, min_count)
+    total = sum(counts.values())
+    kept = sum(subsample.keep.get(w, 1) * c for w, c in counts.items())
+    logger.info(
+        f'Subsampling {len(subsample.keep)} frequent tokens, '
+        f'expected to keep {kept / max(total, 1):.1%} of {total} words.')
+    processor = Processor([subsample], max_sentence_length=max_sentence_length)
+    processor.process_shards(input_path, parse_tokens, output_path, workers)
@@ -0,0 +1,170 @@
+"""Compressed storage of unit word vectors, scored without decompression.
+
+Each codec encodes unit vectors into arrays, and computes the cosine scores
+of a batch of unit queries directly against them:
+
+- `float16`: unit vectors as float16, 2 bytes per dimension.
+- `int8`: unit vectors scaled per row into int8, 1 byte per dimension plus
+  a float32 scale per row.
+- `pq`: product quantization, 1 byte per subspace. Scores are computed from
+  a lookup table of the dot products of the queries with the centroids of
+  each subspace for small batches, and against decoded blocks for large ones.
+"""
+
+from typing import Dict
+
+import numpy as np
+
+BLOCK_SIZE = 1 << 16
+
+
+def _kmeans_l2(x: np.ndarray, k: int, iters: int = 15, seed: int = 0) -> np.ndarray:
+    """Euclidean k-means, returns centroids of shape (k, d)."""
+    rng = np.random.RandomState(seed)
+    k = min(k, len(x))
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(iters):
+        labels = _nearest(x, centroids)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centroids)
+        starts = np.cumsum(counts) - counts
+        nonempty = counts > 0
+        sums[nonempty] = np.add.reduceat(
+            x[np.argsort(labels, kind='stable')], starts[nonempty], axis=0)
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+    return centroids
+
+
+def _nearest(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    labels = np.empty(len(x), dtype=np.int64)
+    c2 = (centroids ** 2).sum(axis=1)
+    for i in range(0, len(x), BLOCK_SIZE):
+        block = x[i:i + BLOCK_SIZE]
+        labels[i:i + BLOCK_SIZE] = np.argmin(c2 - 2 * block @ centroids.T, axis=1)
+    return labels
+
+
+class Codec:
+    """Base class of codecs of unit vectors."""
+
+    name = ''
+
+    def encode(self, unit: np.ndarray) -> Dict[str, np.ndarray]:
+        raise NotImplementedError()
+
+    def decode(self, arrays: Dict[str, np.ndarray], rows) -> np.ndarray:
+        """Approximate unit vectors of `rows`."""
+        raise NotImplementedError()
+
+    def scores(self, arrays: Dict[str, np.ndarray], queries: np.ndarray) -> np.ndarray:
+        """Cosine scores of shape (Q, V) of unit `queries` of shape (Q, d)."""
+        raise NotImplementedError()
+
+
+class Float16Codec(Codec):
+
+    name = 'float16'
+
+    def encode(self, unit):
+        return {'unit16': unit.astype(np.float16)}
+
+    def decode(self, arrays, rows):
+        return arrays['unit16'][rows].astype(np.float32)
+
+    def scores(self, arrays, queries):
+        unit16 = arrays['unit16']
+        scores = np.empty((len(queries), len(unit16)), dtype=np.float32)
+        for i in range(0, len(unit16), BLOCK_SIZE):
+            block = unit16[i:i + BLOCK_SIZE].astype(np.float32)
+            scores[:, i:i + BLOCK_SIZE] = queries @ block.T
+        return scores
+
+
+class Int8Codec(Codec):
+
+    name = 'int8'
+
+    def encode(self, unit):
+        scales = np.abs(unit).max(axis=1) / 127
+        scales = np.where(scales > 0, scales, 1).astype(np.float32)
+        codes = np.round(unit / scales[:, None]).astype(np.int8)
+        return {'codes': codes, 'scales': scales}
+
+    def decode(self, arrays, rows):
+        return arrays['codes'][rows].astype(np.float32) * arrays['scales'][rows, None]
+
+    def scores(self, arrays, queries):
+        codes, scales = arrays['codes'], arrays['scales']
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for i in range(0, len(codes), BLOCK_SIZE):
+            block = codes[i:i + BLOCK_SIZE].astype(np.float32)
+            scores[:, i:i + BLOCK_SIZE] = (queries @ block.T) * scales[i:i + BLOCK_SIZE]
+        return scores
+
+
+class PQCodec(Codec):
+    """Product quantization.
+
+    Args:
+        subspaces (int, optional): Number of subspaces, which must divide the
+            dimension. Defaults to None, a quarter of the dimension.
+        sample_size (int, optional): Number of vectors to train the centroids on.
+            Defaults to 65536.
+        iters (int, optional): Iterations of k-means. Defaults to 15.
+        adc_batch (int, optional): Largest batch of queries scored with lookup
+            tables; larger batches are scored against decoded blocks.
+            Defaults to 8.
+    """
+
+    name = 'pq'
+
+    def __init__(self, subspaces: int = None, sample_size: int = 1 << 16,
+                 iters: int = 15, adc_batch: int = 8):
+        self.subspaces = subspaces
+        self.adc_batch = adc_batch
+        self.sample_size = sample_size
+        self.iters = iters
+
+    def encode(self, unit):
+        n, dim = unit.shape
+        m = self.subspaces or max(dim // 4, 1)
+        if dim % m != 0:
+            raise ValueError(f'{m} subspaces do not divide dimension {dim}.')
+        sub = unit.reshape(n, m, dim // m)
+        rng = np.random.RandomState(0)
+        sample = rng.choice(n, min(self.sample_size, n), replace=False)
+        centroids = np.zeros((m, 256, dim // m), dtype=np.float32)
+        codes = np.empty((n, m), dtype=np.uint8)
+        for j in range(m):
+            c = _kmeans_l2(sub[sample, j], 256, self.iters, seed=j)
+            centroids[j, :len(c)] = c
+            codes[:, j] = _nearest(np.ascontiguousarray(sub[:, j]), c)
+        return {'pq_codes': codes, 'pq_centroids': centroids}
+
+    def decode(self, arrays, rows):
+        codes, centroids = arrays['pq_codes'][rows], arrays['pq_centroids']
+        m = centroids.shape[0]
+        parts = centroids[np.arange(m), codes]
+        return parts.reshape(*codes.shape[:-1], -1)
+
+    def scores(self, arrays, queries):
+        codes, centroids = arrays['pq_codes'], arrays['pq_centroids']
+        m, _, ds = centroids.shape
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        if len(queries) > self.adc_batch:
+            # large batches: a matmul against decoded blocks beats the lookups
+            for i in range(0, len(codes), BLOCK_SIZE):
+                block = self.decode(arrays, slice(i, i + BLOCK_SIZE))
+                scores[:, i:i + BLOCK_SIZE] = queries @ block.T
+            return scores
+        # table[q, j, c]: dot product of subvector j of query q with centroid c
+        table = np.einsum('qjd,jcd->qjc', queries.reshape(len(queries), m, ds), centroids)
+        scores[:] = 0
+        for i in range(0, len(codes), BLOCK_SIZE):
+            block = codes[i:i + BLOCK_SIZE]
+            for j in range(m):
+                scores[:, i:i + BLOCK_SIZE] += table[:, j, block[:, j]]
+        return scores
+
+
+CODECS = {codec.name: codec for codec in [Float16Codec, Int8Codec, PQCodec]}
@@ -0,0 +1,131 @@
+"""Batched similarity and analogy queries with an LRU cache of results.
+
+A query is a pair `(positive, negative)` of word lists, as the arguments of
+`KeyedVectors.most_similar`:
+
+- similar words of `w`: `([w], [])`
+- analogy `a : b = c : ?`: `([b, c], [a])`
+
+`QueryEngine.query_batch` answers the queries missing from the cache with a
+single scoring pass, see `MappedVectors.most_similar_batch`.
+"""
+
+import os
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+
+from .mapped import MappedVectors
+
+Query = Tuple[Tuple[str, ...], Tuple[str, ...]]
+
+
+def parse_query(obj: dict) -> Query:
+    """Query of a JSON object with either `word`, `analogy` as `[a, b, c]`
+    for `a : b = c : ?`, or `positive` and `negative` word lists.
+
+    Raises:
+        ValueError: The object is not a valid query.
+    """
+    if not isinstance(obj, dict):
+        raise ValueError('query must be an object')
+    if 'word' in obj:
+        positive, negative = [obj['word']], []
+    elif 'analogy' in obj:
+        if not isinstance(obj['analogy'], (list, tuple)) or len(obj['analogy']) != 3:
+            raise ValueError('analogy must be a list of 3 words')
+        a, b, c = obj['analogy']
+        positive, negative = [b, c], [a]
+    else:
+        positive, negative = obj.get('positive', []), obj.get('negative', [])
+        if not isinstance(positive, (list, tuple)) or \
+                not isinstance(negative, (list, tuple)):
+            raise ValueError('positive and negative must be lists of words')
+    words = list(positive) + list(negative)
+    if not words or not all(isinstance(w, str) for w in words):
+        raise ValueError('query needs at least one word, and words must be strings')
+    return tuple(positive), tuple(negative)
+
+
+class QueryEngine:
+    """Answers batches of queries against word vectors, caching results.
+
+    The cache is not thread safe: call `query_batch` from one thread at a time.
+
+    Args:
+        vectors (MappedVectors): Word vectors.
+        cache_size (int, optional): Number of cached results. Defaults to 10000.
+    """
+
+    def __init__(self, vectors: MappedVectors, cache_size: int = 10000):
+        self.vectors = vectors
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path: str, cache_size: int = 10000):
+        """Engine of an export folder (see `utils/mapped.py`) or a saved model.
+        """
+        if os.path.isdir(path):
+            vectors = MappedVectors.load(path)
+        else:
+            vectors = MappedVectors.from_model(path)
+        return cls(vectors, cache_size)
+
+    def _cache_get(self, key):
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.move_to_end(key)
+        return result
+
+    def _cache_put(self, key, result):
+        if self.cache_size <= 0:
+            return
+        self.cache[key] = result
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def query_batch(self, queries: Sequence[Query], topn: int = 10) -> List[Dict]:
+        """Answer a batch of queries.
+
+        Args:
+            queries (Sequence[Query]): Queries `(positive, negative)`.
+            topn (int, optional): Number of results per query. Defaults to 10.
+
+        Returns:
+            List[Dict]: For each query, `{'similar': [[word, score], ...]}`, or
+                `{'error': message}` if a word is not in the vocab.
+        """
+        results = [None] * len(queries)
+        pending = {}
+        for i, (positive, negative) in enumerate(queries):
+            key = (tuple(positive), tuple(negative), topn)
+            cached = self._cache_get(key)
+            if cached is not None:
+                self.hits += 1
+                results[i] = cached
+                continue
+            missing = [w for w in key[0] + key[1] if w not in self.vectors]
+            if missing:
+                results[i] = {'error': f'not in vocabulary: {" ".join(missing)}'}
+                continue
+            pending.setdefault(key, []).append(i)
+        self.misses += len(pending)
+        if pending:
+            keys = list(pending)
+            answers = self.vectors.most_similar_batch(
+                [(key[0], key[1]) for key in keys], topn)
+            for key, answer in zip(keys, answers):
+                result = {'similar': [[w, round(s, 6)] for w, s in answer]}
+                self._cache_put(key, result)
+                for i in pending[key]:
+                    results[i] = result
+        return results
+
+    def cache_info(self) -> Dict:
+        return {
+            'hits': self.hits, 'misses': self.misses,
+            'size': len(self.cache), 'max_size': self.cache_size,
+        }
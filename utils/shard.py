@@ -0,0 +1,86 @@
+"""Split line-based files into byte ranges that can be read independently.
+"""
+
+import mmap
+import os
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+
+def line_ranges(path: str, n: int) -> List[Tuple[int, int]]:
+    """Split a file into at most `n` byte ranges aligned to line boundaries.
+
+    Args:
+        path (str): Path to the file on disk.
+        n (int): Number of ranges.
+
+    Returns:
+        List[Tuple[int, int]]: Non-empty ranges `(start, end)` covering the file.
+    """
+    size = os.path.getsize(path)
+    n = max(n, 1)
+    bounds = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, n):
+            offset = size * i // n
+            if offset <= bounds[-1]:
+                continue
+            f.seek(offset - 1)
+            f.readline()
+            bounds.append(min(f.tell(), size))
+    bounds.append(size)
+    return [(s, e) for s, e in zip(bounds, bounds[1:]) if s < e]
+
+
+def iter_lines(path: str, start: int = 0, end: int = None) -> Iterator[bytes]:
+    """Iterate lines of a file within the byte range `[start, end)` using mmap.
+
+    `start` and `end` should be line boundaries, e.g. given by `line_ranges`.
+
+    Args:
+        path (str): Path to the file on disk.
+        start (int, optional): Start offset. Defaults to 0.
+        end (int, optional): End offset. Defaults to the end of the file.
+
+    Yields:
+        bytes: Lines including the trailing newline.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = len(mm) if end is None else end
+            mm.seek(start)
+            while mm.tell() < end:
+                yield mm.readline()
+
+
+class LineArticles:
+    """Articles of a line-based file, e.g. JSON lines, which can be resumed
+    from a byte offset, see `Processor.process_all`.
+
+    Args:
+        path (str): Path to the file on disk.
+        parse (Callable[[bytes], Iterable[str]]): Function to parse a line into
+            an article. Lines for which it returns None are skipped.
+    """
+
+    def __init__(self, path: str, parse: Callable[[bytes], Iterable[str]]):
+        self.path = path
+        self.parse = parse
+
+    def __iter__(self) -> Iterator[Iterable[str]]:
+        for _, article in self.iter_from(None):
+            yield article
+
+    def iter_from(self, position: int = None) -> Iterator[Tuple[int, Iterable[str]]]:
+        """Yield articles from the byte offset `position`, each with the offset
+        of the line after it.
+        """
+        offset = position or 0
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                offset += len(line)
+                article = self.parse(line)
+                if article is not None:
+                    yield offset, article
@@ -0,0 +1,78 @@
+"""Batched similarity queries with numpy.
+
+Queries are answered with a single matrix product against unit vectors,
+instead of one brute-force pass per word as `KeyedVectors.most_similar`.
+"""
+
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+
+def unit_vectors(vectors: np.ndarray, norms: np.ndarray = None) -> np.ndarray:
+    """Normalize the rows of `vectors` to unit length, as float32.
+
+    Args:
+        vectors (np.ndarray): Matrix of shape (V, d).
+        norms (np.ndarray, optional): Precomputed L2 norms of the rows.
+
+    Returns:
+        np.ndarray: Matrix of unit rows. Zero rows stay zero.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if norms is None:
+        norms = np.linalg.norm(vectors, axis=1)
+    norms = np.where(norms > 0, norms, 1).astype(np.float32)
+    return vectors / norms[:, None]
+
+
+def top_k(scores: np.ndarray, k: int,
+          exclude: Sequence[Sequence[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices and values of the `k` largest scores of each row, in
+    decreasing order.
+
+    Args:
+        scores (np.ndarray): Matrix of shape (Q, V).
+        k (int): Number of results per row.
+        exclude (Sequence[Sequence[int]], optional): Indices to exclude for
+            each row, e.g. the query words themselves. `scores` is modified.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Indices and scores of shape (Q, k).
+    """
+    if exclude is not None:
+        for row, ids in enumerate(exclude):
+            scores[row, list(ids)] = -np.inf
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        empty = np.zeros((scores.shape[0], 0))
+        return empty.astype(np.int64), empty
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-values, axis=1)
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(values, order, axis=1)
+
+
+def most_similar(unit: np.ndarray, query_ids: Sequence[int], topn: int = 10,
+                 words: Sequence[str] = None) -> List[List[Tuple]]:
+    """Most similar entries of a batch of entries of `unit`, excluding themselves.
+
+    Args:
+        unit (np.ndarray): Unit vectors of shape (V, d).
+        query_ids (Sequence[int]): Row indices of the queries.
+        topn (int, optional): Number of results per query. Defaults to 10.
+        words (Sequence[str], optional): Words of the rows. If given, results
+            are words instead of row indices.
+
+    Returns:
+        List[List[Tuple]]: `(index or word, cosine similarity)` for each query.
+    """
+    if len(query_ids) == 0:
+        return []
+    scores = unit[list(query_ids)] @ unit.T
+    ids, values = top_k(scores, topn, exclude=[[i] for i in query_ids])
+    results = []
+    for row_ids, row_values in zip(ids.tolist(), values.tolist()):
+        keys = row_ids if words is None else [words[i] for i in row_ids]
+        results.append(list(zip(keys, row_values)))
+    return results
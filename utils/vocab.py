@@ -0,0 +1,109 @@
+"""Count the vocabulary of a text corpus in parallel, and save it as an
+artifact that can be loaded instead of scanning the corpus again.
+
+The artifact is a tab separated file: a first line `# {json}` with the
+number of sentences and words of the corpus and the sizes and modification
+times of its files, then one `token\\tcount` per line, most frequent first.
+"""
+
+import json
+import os
+from collections import Counter
+from multiprocessing import Pool, cpu_count
+from typing import Dict, Tuple
+
+from .corpus import MAX_SENTENCE_LENGTH, _source_meta, text_files
+from .shard import iter_lines, line_ranges
+
+
+def _count_range(args) -> Tuple[Counter, int, int]:
+    """Count tokens, sentences and words in a byte range of a file.
+
+    Sentences are counted as `LineSentence` yields them: long lines are split
+    every `MAX_SENTENCE_LENGTH` tokens and empty lines are skipped.
+    """
+    path, start, end = args
+    counts = Counter()
+    sentences = 0
+    words = 0
+    for line in iter_lines(path, start, end):
+        tokens = line.decode('utf-8').split()
+        if not tokens:
+            continue
+        counts.update(tokens)
+        words += len(tokens)
+        sentences += (len(tokens) - 1) // MAX_SENTENCE_LENGTH + 1
+    return counts, sentences, words
+
+
+def count_vocab(source: str, workers: int = None) -> Tuple[Counter, int, int]:
+    """Count the tokens of a text corpus across processes.
+
+    Every file is split into line-aligned byte ranges, the ranges are counted
+    in a process pool, and the counters are merged.
+
+    Args:
+        source (str): Text file or folder of text files.
+        workers (int, optional): Number of processes. Defaults to the number
+            of cpus.
+
+    Returns:
+        Tuple[Counter, int, int]: Token counts, number of sentences and
+        number of words.
+    """
+    workers = workers or cpu_count()
+    tasks = [
+        (path, start, end)
+        for path in text_files(source)
+        for start, end in line_ranges(path, 4 * workers)
+    ]
+    counts = Counter()
+    sentences = 0
+    words = 0
+    with Pool(workers) as pool:
+        for c, s, w in pool.imap_unordered(_count_range, tasks):
+            counts.update(c)
+            sentences += s
+            words += w
+    return counts, sentences, words
+
+
+def save_vocab(path: str, counts: Dict[str, int], sentences: int, words: int,
+               source: str = None):
+    """Save token counts as a vocab artifact, of the corpus `source` if it is
+    given.
+    """
+    with open(path, 'w') as f:
+        meta = {'sentences': sentences, 'words': words, 'tokens': len(counts)}
+        if source is not None:
+            meta['source'] = _source_meta(source)
+        f.write(f'# {json.dumps(meta)}\n')
+        for w, c in sorted(counts.items(), key=lambda x: (-x[1], x[0])):
+            f.write(f'{w}\t{c}\n')
+
+
+def load_vocab(path: str) -> Tuple[Dict[str, int], int, int]:
+    """Load a vocab artifact saved by `save_vocab`.
+
+    Returns:
+        Tuple[Dict[str, int], int, int]: Token counts, number of sentences and
+        number of words.
+    """
+    counts = {}
+    with open(path, 'r') as f:
+        meta = json.loads(f.readline()[2:])
+        for line in f:
+            w, c = line.rstrip('\n').split('\t')
+            counts[w] = int(c)
+    return counts, meta['sentences'], meta['words']
+
+
+def is_vocab_of(path: str, source: str) -> bool:
+    """Whether `path` is a vocab artifact of `source`, which has not changed
+    since it was counted.
+    """
+    if not os.path.exists(path):
+        return False
+    with open(path, 'r') as f:
+        meta = json.loads(f.readline()[2:])
+    return meta.get('source') == _source_meta(source)
@@ -0,0 +1,188 @@
+"""Read articles from a multistream Wikipedia dump in parallel.
+
+A multistream dump, e.g. `zhwiki-latest-pages-articles-multistream.xml.bz2`,
+is a concatenation of independent bz2 streams of about 100 pages each. Every
+stream can be decompressed and parsed on its own, so the dump is split into
+streams which are decompressed, parsed and tokenized across processes.
+
+Articles are tokenized and filtered exactly as `WikiCorpus.get_texts` does
+with its default arguments, and yielded in the same order.
+"""
+
+import bz2
+import io
+import mmap
+import re
+from bisect import bisect_left
+from collections import deque
+from multiprocessing import Pool, cpu_count
+from typing import Iterator, List, Tuple
+
+from gensim.corpora.wikicorpus import (ARTICLE_MIN_WORDS, IGNORED_NAMESPACES,
+                                       TOKEN_MAX_LEN, TOKEN_MIN_LEN,
+                                       extract_pages, filter_wiki, tokenize)
+
+# stream header "BZh" + block size, followed by the magic of the first block
+STREAM_MAGIC = re.compile(rb'BZh[1-9]1AY&SY')
+READ_SIZE = 1 << 20
+
+
+def stream_offsets(path: str) -> List[int]:
+    """Find the offsets of the bz2 streams of a dump.
+
+    Candidates are byte-aligned matches of the stream header. A false match
+    inside compressed data is possible but harmless: it fails to decompress
+    and is skipped by `_stream_articles`.
+
+    Args:
+        path (str): Path to the bz2 dump.
+
+    Returns:
+        List[int]: Offsets of the candidate streams.
+    """
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return [m.start() for m in STREAM_MAGIC.finditer(mm)]
+
+
+def _decompress_stream(path: str, offset: int) -> bytes:
+    """Decompress the bz2 stream starting at `offset`.
+
+    Returns:
+        bytes: Decompressed data, or None if there is no valid stream at `offset`.
+    """
+    decompressor = bz2.BZ2Decompressor()
+    data = []
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        try:
+            while not decompressor.eof:
+                block = f.read(READ_SIZE)
+                if not block:
+                    return None
+                data.append(decompressor.decompress(block))
+        except OSError:
+            return None
+    return b''.join(data)
+
+
+def _root_tag(data: bytes) -> bytes:
+    """Get the opening `<mediawiki ...>` tag from the first stream."""
+    start = data.index(b'<mediawiki')
+    return data[start:data.index(b'>', start) + 1]
+
+
+def _stream_articles(path: str, offset: int, root_tag: bytes) -> List[List[str]]:
+    """Decompress, parse and tokenize the pages of a stream.
+
+    Args:
+        path (str): Path to the dump.
+        offset (int): Offset of the stream.
+        root_tag (bytes): Opening tag of the dump, to make the stream valid xml.
+
+    Returns:
+        List[List[str]]: Tokens of the articles of the stream.
+    """
+    data = _decompress_stream(path, offset)
+    if data is None or b'<page>' not in data:
+        return []
+    if b'<mediawiki' not in data:
+        data = root_tag + data
+    if not data.rstrip().endswith(b'</mediawiki>'):
+        data += b'</mediawiki>'
+
+    articles = []
+    for title, text, pageid in extract_pages(io.BytesIO(data), ('0',)):
+        tokens = tokenize(filter_wiki(text), TOKEN_MIN_LEN, TOKEN_MAX_LEN, True)
+        if len(tokens) < ARTICLE_MIN_WORDS or \
+                any(title.startswith(ignore + ':') for ignore in IGNORED_NAMESPACES):
+            continue
+        articles.append(tokens)
+    return articles
+
+
+def is_multistream(path: str) -> bool:
+    """Whether the dump at `path` consists of more than one bz2 stream.
+
+    Only the beginning of the dump is scanned, since the first stream of a
+    multistream dump only contains the site info.
+    """
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return STREAM_MAGIC.search(mm, 1, 16 * READ_SIZE) is not None
+
+
+def wiki_articles_from(path: str, position: List[int] = None,
+                       processes: int = None) -> Iterator[Tuple[List[int], List[str]]]:
+    """Yield tokenized articles of a multistream dump from `position`, each
+    with its position `[offset, k]`: it is the `k`-th article of the stream at
+    `offset`. The streams before `position` are not decompressed.
+
+    Args:
+        path (str): Path to the multistream bz2 dump.
+        position (List[int], optional): Position of the last article to skip.
+            Defaults to None, which starts from the first article.
+        processes (int, optional): Number of processes to decompress and parse
+            streams. Defaults to the number of cpus minus one.
+
+    Yields:
+        Tuple[List[int], List[str]]: Position and tokens of an article.
+    """
+    if processes is None:
+        processes = max(1, cpu_count() - 1)
+    offsets = stream_offsets(path)
+    if not offsets:
+        return
+    root_tag = _root_tag(_decompress_stream(path, offsets[0]))
+    first, skip = position if position is not None else (offsets[0], 0)
+
+    def positioned(offset, articles):
+        for k, article in enumerate(articles, 1):
+            if offset != first or k > skip:
+                yield [offset, k], article
+
+    with Pool(processes) as pool:
+        # keep a bounded number of streams in flight, so that decompressed
+        # data does not pile up in memory when the consumer is slower
+        window = 16 * processes
+        pending = deque()
+        for offset in offsets[bisect_left(offsets, first):]:
+            pending.append((offset, pool.apply_async(
+                _stream_articles, (path, offset, root_tag))))
+            if len(pending) >= window:
+                offset, result = pending.popleft()
+                yield from positioned(offset, result.get())
+        while pending:
+            offset, result = pending.popleft()
+            yield from positioned(offset, result.get())
+
+
+def wiki_articles(path: str, processes: int = None) -> Iterator[List[str]]:
+    """Yield tokenized articles of a multistream dump.
+
+    Args:
+        path (str): Path to the multistream bz2 dump.
+        processes (int, optional): Number of processes to decompress and parse
+            streams. Defaults to the number of cpus minus one.
+
+    Yields:
+        List[str]: Tokens of an article.
+    """
+    for _, article in wiki_articles_from(path, None, processes):
+        yield article
+
+
+class WikiArticles:
+    """Articles of a multistream dump, which can be resumed from a position
+    of `wiki_articles_from`, see `Processor.process_all`.
+    """
+
+    def __init__(self, path: str, processes: int = None):
+        self.path = path
+        self.processes = processes
+
+    def __iter__(self) -> Iterator[List[str]]:
+        return wiki_articles(self.path, self.processes)
+
+    def iter_from(self, position: List[int] = None):
+        return wiki_articles_from(self.path, position, self.processes)
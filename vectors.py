@@ -0,0 +1,54 @@
+import argparse
+
+import settings
+from utils.ann import IVFIndex
+from utils.mapped import DTYPES, export_model
+
+logger = settings.LOGGER
+
+
+def build_index(opts):
+    logger.info(f'Building index of {opts.model} ...')
+    index = IVFIndex.from_model(opts.model, n_lists=opts.n_lists, iters=opts.iters)
+    path = f'{opts.model}.ivf'
+    index.save(path)
+    logger.info(f'Saved index of {len(index.centroids)} lists to {path}')
+
+
+def export(opts):
+    logger.info(f'Exporting word vectors of {opts.model} ...')
+    folder = export_model(opts.model, dtype=opts.dtype)
+    logger.info(f'Exported word vectors to {folder}')
+
+
+def get_vectors_options():
+    parser = argparse.ArgumentParser(
+        description='Tools for the word vectors of trained models',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    index = commands.add_parser(
+        'index', help='Build an approximate nearest neighbour index next to a model.')
+    index.add_argument('--model', '-m', type=str, required=True,
+                       help='Path to a saved Word2Vec model.')
+    index.add_argument('--n_lists', type=int, default=None,
+                       help='Number of clusters. Defaults to 4 * sqrt(vocab size).')
+    index.add_argument('--iters', type=int, default=10,
+                       help='Iterations of k-means.')
+    index.set_defaults(func=build_index)
+
+    export_parser = commands.add_parser(
+        'export', help='Export word vectors as memory mappable arrays next to a model.')
+    export_parser.add_argument('--model', '-m', type=str, required=True,
+                               help='Path to a saved Word2Vec model.')
+    export_parser.add_argument('--dtype', type=str, default='float32', choices=DTYPES,
+                               help='Storage type of the vectors.')
+    export_parser.set_defaults(func=export)
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    opts = get_vectors_options()
+    opts.func(opts)
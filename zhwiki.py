@@ -6,7 +6,9 @@ from gensim.corpora import WikiCorpus, dictionary
 import settings
 from utils.download import download
 from utils.processor import (ConvertT2S, CutSentence, Processor,
-                             RemoveNonChineseWords, RemoveStopwords)
+                             RemoveNonChineseWords, RemoveStopwords,
+                             subsample_corpus)
+from utils.wiki import WikiArticles, is_multistream
 from train import train, get_train_options
 
 logger = settings.LOGGER
@@ -25,30 +27,64 @@ def download_zhwiki():
 
 def preprocess_zhwiki():
     output_path = settings.ZHWIKI_CLEANED_PATH
-    if os.path.exists(output_path):
+    if os.path.exists(output_path) and not settings.INCREMENTAL_PREPROCESS:
         logger.info(f'{output_path} existed. Skip preprocess.')
         logger.info(f'Delete {output_path} if preprocess needs to be redone.')
         return
 
     input_path = settings.ZHWIKI_PATH
     processor = Processor([
-        ConvertT2S(),
-        CutSentence(),
+        ConvertT2S(cache_size=settings.PIPELINE_CACHE_SIZE),
+        CutSentence(cache_size=settings.PIPELINE_CACHE_SIZE),
         RemoveNonChineseWords(),
         RemoveStopwords(),
     ])
-    wiki = WikiCorpus(input_path, dictionary={})
-    processor.process_all(wiki.get_texts(), output_path)
+    if is_multistream(input_path):
+        articles = WikiArticles(input_path)
+    else:
+        logger.info(f'{input_path} is a single stream dump. Use WikiCorpus.')
+        articles = WikiCorpus(input_path, dictionary={}).get_texts()
+    if settings.INCREMENTAL_PREPROCESS:
+        processor.process_incremental(
+            articles, f'{output_path}.incremental', merge_path=output_path)
+        return
+    processor.process_all(
+        articles, output_path, resumable=True,
+        profile=settings.PROCESSOR_PROFILE,
+        profile_path=f'{output_path}.profile.json')
+
+
+def subsample_zhwiki():
+    if not (settings.PREPROCESS_SUBSAMPLE or settings.PREPROCESS_MAX_SENTENCE_LENGTH):
+        return
+    input_path = settings.ZHWIKI_CLEANED_PATH
+    output_path = settings.ZHWIKI_SUBSAMPLED_PATH
+    if os.path.exists(output_path) and \
+            os.path.getmtime(output_path) > os.path.getmtime(input_path):
+        logger.info(f'{output_path} existed. Skip subsample.')
+        return
+    subsample_corpus(
+        input_path, output_path, settings.PREPROCESS_SUBSAMPLE,
+        vocab_path=f'{input_path}.vocab.tsv',
+        max_sentence_length=settings.PREPROCESS_MAX_SENTENCE_LENGTH,
+        min_count=get_train_options().min_count)
 
 
 def train_zhwiki():
     opts = get_train_options()
     opts.input_file = settings.ZHWIKI_CLEANED_PATH
+    if settings.PREPROCESS_SUBSAMPLE or settings.PREPROCESS_MAX_SENTENCE_LENGTH:
+        opts.input_file = settings.ZHWIKI_SUBSAMPLED_PATH
+    if settings.PREPROCESS_SUBSAMPLE:
+        opts.sample = 0
     opts.name_prefix = 'zhwiki'
     train(opts)
 
 
 if __name__ == '__main__':
+    if settings.LOGGER_QUEUE:
+        logger.start_queue()
     download_zhwiki()
     preprocess_zhwiki()
+    subsample_zhwiki()
     train_zhwiki()